@@ -0,0 +1,72 @@
+"""
+Batch strategy generation: analysis -> strategy for many products, with bounded
+concurrency and search/LLM results shared across the whole batch.
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+
+from agent.graph import generation_agent
+from agent.scheduler import llm_context
+from agent.tools import shared_cache
+from agent.usage import track_usage
+
+logger = logging.getLogger(__name__)
+
+
+async def _generate(index: int, product: str, slots: asyncio.Semaphore) -> dict:
+    async with slots:
+        start = time.monotonic()
+        with track_usage(label=f"batch item {index}") as usage:
+            try:
+                result = await generation_agent.ainvoke({"messages": [], "user_message": product})
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {e!r}")
+                return {
+                    "index": index,
+                    "product": product,
+                    "status": "error",
+                    "error": str(e),
+                    "seconds": round(time.monotonic() - start, 3),
+                }
+        return {
+            "index": index,
+            "product": product,
+            "status": "ok",
+            "analysis": result["analysis"].model_dump(mode="json"),
+            "strategy": result["strategy"].model_dump(mode="json"),
+            "usage": usage.to_dict(),
+            "seconds": round(time.monotonic() - start, 3),
+        }
+
+
+async def run_batch(products: List[str], concurrency: int, user_id: Optional[str] = None) -> AsyncIterator[dict]:
+    """Yield each product's result as soon as it finishes, then a summary record.
+
+    LLM calls run in the scheduler's batch class, so chat turns go first."""
+    slots = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+    succeeded = 0
+    with shared_cache() as cache, llm_context(user_id=user_id, priority="batch"):
+        tasks = [asyncio.ensure_future(_generate(i, p, slots)) for i, p in enumerate(products)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                succeeded += item["status"] == "ok"
+                yield {"type": "result", **item}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        elapsed = time.monotonic() - start
+        yield {
+            "type": "summary",
+            "products": len(products),
+            "succeeded": succeeded,
+            "failed": len(products) - succeeded,
+            "concurrency": concurrency,
+            "seconds": round(elapsed, 3),
+            "products_per_minute": round(len(products) / elapsed * 60, 2) if elapsed else None,
+            "cache": {"hits": cache["hits"], "misses": cache["misses"]},
+        }
@@ -1,18 +1,72 @@
 # agent/config.py (new file) or add to top of agent/graph.py
 
 import os
+import groq
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
-from tavily import TavilyClient
+
+from agent.http_pool import http_pool
+from agent.llm_gateway import LLMGateway
+from agent.resilience import RetryPolicy
+from agent.search import TavilySearch
 
 load_dotenv()
 
-# LLM configuration (Groq)
-LLM = ChatGroq(
-    api_key=os.getenv("GROK_API_KEY"),
-    model_name=os.getenv("MODEL"),
-    temperature=0.0,  # Deterministic for structured output
+PROVIDERS = {
+    "groq": lambda model_name: ChatGroq(
+        api_key=os.getenv("GROK_API_KEY"),
+        model_name=model_name,
+        temperature=0.0,  # Deterministic for structured output
+        http_client=http_pool.sync_client,
+        http_async_client=http_pool.async_client,
+        max_retries=0,  # Retries are owned by the gateway's retry policy and breakers
+    ),
+}
+
+# Connection problems, rate limits and 5xx are worth retrying; 4xx and parse errors are not
+LLM_RETRY_POLICY = RetryPolicy(
+    is_failure=lambda e: isinstance(e, (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5")),
 )
 
+
+def _build_model(spec: str):
+    """Build a chat model from a "provider:model" spec (provider defaults to groq)"""
+    provider, _, model_name = spec.rpartition(":")
+    provider = provider or "groq"
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{provider}' in '{spec}'")
+    return PROVIDERS[provider](model_name)
+
+
+# LLM configuration (Groq)
+LLM = PROVIDERS["groq"](os.getenv("MODEL"))
+
+# Failover/hedge targets, tried in order after the primary model of each tier
+FALLBACK_MODELS = [spec.strip() for spec in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if spec.strip()]
+
+
+def _build_gateway(primary, primary_name: str) -> LLMGateway:
+    return LLMGateway(
+        models=[primary] + [_build_model(spec) for spec in FALLBACK_MODELS],
+        model_names=[primary_name] + FALLBACK_MODELS,
+        timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "90")),
+        interactive_timeout_seconds=float(os.getenv("LLM_INTERACTIVE_TIMEOUT_SECONDS", "20")),
+        max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+        hedge_initial_delay_seconds=float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "3")),
+        hedge_min_delay_seconds=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5")),
+        retry_policy=LLM_RETRY_POLICY,
+    )
+
+
+# Large tier: analysis and strategy generation
+llm_gateway = _build_gateway(LLM, os.getenv("MODEL"))
+
+# Fast tier: discovery conversation. Falls back to the large model if FAST_MODEL is unset.
+FAST_MODEL = os.getenv("FAST_MODEL")
+FAST_LLM = _build_model(FAST_MODEL) if FAST_MODEL else LLM
+fast_gateway = _build_gateway(FAST_LLM, FAST_MODEL or os.getenv("MODEL"))
+
 # Tavily search client
-tavily = TavilyClient(api_key=os.getenv("TAVIKY_API_KEY"))
\ No newline at end of file
+tavily = TavilySearch(api_key=os.getenv("TAVIKY_API_KEY"), client=http_pool.async_client)
@@ -0,0 +1,131 @@
+"""
+Token-budgeted research context for the analysis and strategy prompts.
+
+Search results from every query a node runs are merged, deduplicated by URL
+and by near-duplicate content, reranked against the product description, and
+packed into an explicit token budget. The budget covers snippet text only:
+every source that survives deduplication is listed with its title and URL,
+and the budget decides which of them also get a snippet, so the model can
+cite everything the search found.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+CHARS_PER_TOKEN = 4
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "will", "with", "you",
+    "your", "our", "we", "i", "my", "me", "they", "their", "can", "how", "what", "who",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    """Word shingles of the text; empty when it is too short to compare meaningfully"""
+    words = _terms(text)
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _snippet(content: str, max_chars: int) -> str:
+    content = re.sub(r"\s+", " ", content).strip()
+    if len(content) <= max_chars:
+        return content
+    cut = content[:max_chars]
+    # Prefer ending on a sentence, then on a word boundary
+    sentence_end = cut.rfind(". ")
+    if sentence_end > max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+class ResearchContextBuilder:
+    def __init__(self, product: str, token_budget: int, max_snippet_chars: int = 400):
+        self.product_terms = Counter(_terms(product))
+        self.token_budget = token_budget
+        self.max_snippet_chars = max_snippet_chars
+        self.sections: Dict[str, List[dict]] = {}
+        self.stats = {"input": 0, "duplicate_url": 0, "near_duplicate": 0, "packed": 0, "citation_only": 0}
+
+    def add(self, section: str, results: Iterable[dict]) -> "ResearchContextBuilder":
+        self.sections.setdefault(section, []).extend(results)
+        return self
+
+    def _relevance(self, result: dict) -> float:
+        terms = _terms(f"{result.get('title', '')} {result.get('content', '')}")
+        if not terms or not self.product_terms:
+            overlap = 0.0
+        else:
+            counts = Counter(terms)
+            overlap = sum(min(counts[t], 3) for t in self.product_terms) / (3 * len(self.product_terms))
+        # Blend our lexical overlap with Tavily's own score when present
+        return 0.6 * overlap + 0.4 * float(result.get("score") or 0.0)
+
+    def build(self, exclude_urls: Optional[Set[str]] = None) -> str:
+        seen_urls = {normalize_url(u) for u in (exclude_urls or ())}
+        kept_shingles: List[Set[tuple]] = []
+        candidates = []
+        for section, results in self.sections.items():
+            for result in results:
+                self.stats["input"] += 1
+                url = normalize_url(result.get("url", ""))
+                if url in seen_urls:
+                    self.stats["duplicate_url"] += 1
+                    continue
+                shingles = _shingles(result.get("content", ""))
+                # Too little text to compare: keep it rather than match every other short result
+                if shingles and any(len(shingles & other) / len(shingles | other) >= NEAR_DUPLICATE_THRESHOLD
+                                    for other in kept_shingles):
+                    self.stats["near_duplicate"] += 1
+                    continue
+                seen_urls.add(url)
+                if shingles:
+                    kept_shingles.append(shingles)
+                candidates.append((self._relevance(result), section, result))
+
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        remaining = self.token_budget
+        packed: Dict[str, List[str]] = {section: [] for section in self.sections}
+        self.packed_urls: Set[str] = set()
+        citation_tokens = 0
+        for _, section, result in candidates:
+            # Title and URL are always kept; the snippet only while the budget lasts
+            title = f"- {result.get('title', '').strip()}\n"
+            url = f"  URL: {result.get('url', '')}\n"
+            snippet = f"  {_snippet(result.get('content', ''), self.max_snippet_chars)}\n"
+            cost = estimate_tokens(snippet)
+            if snippet.strip() and cost <= remaining:
+                remaining -= cost
+                packed[section].append(title + snippet + url)
+                self.stats["packed"] += 1
+            else:
+                packed[section].append(title + url)
+                self.stats["citation_only"] += 1
+            citation_tokens += estimate_tokens(title + url)
+            self.packed_urls.add(normalize_url(result.get("url", "")))
+
+        self.stats["snippet_tokens"] = self.token_budget - remaining
+        self.stats["citation_tokens"] = citation_tokens
+        blocks = [
+            f"Web search results - {section}:\n\n" + "\n".join(entries)
+            for section, entries in packed.items()
+            if entries
+        ]
+        return "\n\n".join(blocks)
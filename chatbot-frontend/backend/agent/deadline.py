@@ -0,0 +1,69 @@
+"""
+End-to-end request deadlines for agent runs.
+
+The route sets an absolute deadline (time.monotonic() based) in
+MarketingState; every node reads the time left and sizes its work to fit:
+fewer search results, skipped secondary searches, the fast tier instead of
+the large one. External calls never get a timeout past the deadline.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "75"))
+
+# Below these budgets a node switches to its degraded plan
+ANALYSIS_FULL_SECONDS = float(os.getenv("ANALYSIS_FULL_SECONDS", "60"))
+ANALYSIS_LARGE_TIER_SECONDS = float(os.getenv("ANALYSIS_LARGE_TIER_SECONDS", "40"))
+STRATEGY_FULL_SECONDS = float(os.getenv("STRATEGY_FULL_SECONDS", "35"))
+STRATEGY_LARGE_TIER_SECONDS = float(os.getenv("STRATEGY_LARGE_TIER_SECONDS", "20"))
+# Share of the remaining budget a web search may use before it is abandoned
+SEARCH_BUDGET_SHARE = float(os.getenv("SEARCH_BUDGET_SHARE", "0.25"))
+# Searches that would get less than this are skipped outright
+MIN_SEARCH_SECONDS = float(os.getenv("MIN_SEARCH_SECONDS", "2"))
+
+
+def deadline_in(seconds: float = REQUEST_DEADLINE_SECONDS) -> float:
+    return time.monotonic() + seconds
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """Seconds until the deadline; None when the run has no deadline"""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        deadline_stats.expired += 1
+        raise asyncio.TimeoutError("Request deadline exceeded")
+    return remaining
+
+
+def cap(timeout: Optional[float], remaining: Optional[float]) -> Optional[float]:
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class DeadlineStats:
+    def __init__(self):
+        self.expired = 0
+        self.degradations = defaultdict(int)  # "node:action" -> count
+
+    def degrade(self, node: str, action: str, remaining: float) -> None:
+        self.degradations[f"{node}:{action}"] += 1
+        logger.info(f"{node}: {action} with {remaining:.1f}s left")
+
+    def snapshot(self) -> dict:
+        return {
+            "request_deadline_seconds": REQUEST_DEADLINE_SECONDS,
+            "expired": self.expired,
+            "degradations": dict(self.degradations),
+        }
+
+
+deadline_stats = DeadlineStats()
@@ -1,7 +1,27 @@
+import asyncio
+import logging
+import os
+import time
 from typing import Optional, TypedDict, List
 from agent.schemas import ProductAnalysis, MarketingStrategy, ConversationResponse
-from agent.prompts import intent_prompt, analysis_prompt, marketing_strategy_planner, conversational_consultant_prompt
-from agent.config import LLM, tavily
+from agent.prompts import analysis_prompt, marketing_strategy_planner, conversational_consultant_prompt
+from agent.tools import web_search, structured_llm
+from agent.router import classify_turn, tier_stats
+from agent.context_builder import ResearchContextBuilder
+from agent.speculation import speculator, product_brief, product_description, research_queries
+from agent.deadline import (
+    time_left, deadline_stats, SEARCH_BUDGET_SHARE, MIN_SEARCH_SECONDS,
+    ANALYSIS_FULL_SECONDS, ANALYSIS_LARGE_TIER_SECONDS, STRATEGY_FULL_SECONDS, STRATEGY_LARGE_TIER_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Snippet budgets; every deduplicated source is cited by title and URL on top of these
+ANALYSIS_CONTEXT_TOKEN_BUDGET = int(os.getenv("ANALYSIS_CONTEXT_TOKEN_BUDGET", "1000"))
+STRATEGY_CONTEXT_TOKEN_BUDGET = int(os.getenv("STRATEGY_CONTEXT_TOKEN_BUDGET", "600"))
+
+# Used when web search is degraded (Tavily down or its circuit open)
+NO_RESEARCH_CONTEXT = "(Live web research is unavailable for this request. Rely on well-established, widely known sources only.)"
 
 class MarketingState(TypedDict):
     messages: List[dict] # Chat history [{role, content}]
@@ -10,17 +30,43 @@ class MarketingState(TypedDict):
     analysis: Optional[ProductAnalysis]
     strategy: Optional[MarketingStrategy]
     conversation_response: Optional[str] # To store the reliable response text
+    research_urls: Optional[List[str]] # Sources already packed into the analysis prompt
+    deadline: Optional[float] # time.monotonic() by which the whole request must finish
+    session_id: Optional[str] # Chat session, keys speculative research
+
 
+def _speculate(state: MarketingState, should_generate_strategy: bool) -> None:
+    # Still in discovery: start analysis research early once the product is described
+    if not should_generate_strategy:
+        description = product_description(state.get("messages", []), state["user_message"])
+        speculator.maybe_start(state.get("session_id"), product_brief(description))
 
-def conversation_node(state: MarketingState):
+
+async def conversation_node(state: MarketingState):
     history = state.get("messages", [])
+    
+    # Local fast path: greetings, thanks and the final confirmation need no LLM
+    start = time.monotonic()
+    decision = classify_turn(state["user_message"], history)
+    if decision is not None:
+        tier_stats.record("local", time.monotonic() - start)
+        _speculate(state, decision.should_generate_strategy)
+        return {
+            "intent": "GENERATE_STRATEGY" if decision.should_generate_strategy else "CONTINUE_CONVERSATION",
+            "conversation_response": decision.response_to_user
+        }
+    
     # Convert dict history to string for prompt
     history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
     current_msg = state["user_message"]
     full_history = f"{history_str}\nuser: {current_msg}"
     
     prompt = conversational_consultant_prompt(full_history)
-    decision = LLM.with_structured_output(ConversationResponse).invoke(prompt)
+    decision = await structured_llm(
+        ConversationResponse, prompt, node="conversation", tier="fast", interactive=True,
+        timeout=time_left(state.get("deadline")),
+    )
+    _speculate(state, decision.should_generate_strategy)
     
     return {
         "intent": "GENERATE_STRATEGY" if decision.should_generate_strategy else "CONTINUE_CONVERSATION",
@@ -28,24 +74,52 @@ def conversation_node(state: MarketingState):
     }
 
 
-def analysis_node(state: MarketingState):
-    user_request = state["user_message"]
+def _search_timeout(remaining: Optional[float]) -> Optional[float]:
+    return None if remaining is None else remaining * SEARCH_BUDGET_SHARE
+
+
+async def analysis_node(state: MarketingState):
+    # The current message is usually just the confirmation; describe the product from the whole conversation
+    user_request = product_description(state.get("messages", []), state["user_message"]) or state["user_message"]
+    # Searches (and the speculation lookup) use a shortened brief; the prompt gets everything
+    brief = product_brief(user_request)
+    remaining = time_left(state.get("deadline"))
     
-    # Tavily searches to provide real-world context
-    competitor_query = f"top competitors OR similar products OR alternatives to: {user_request}"
-    competitor_results = tavily.search(query=competitor_query, max_results=10)
+    # Size the research to the time left: fewer results, then no insights search, then no search
+    competitor_max, insights_max, tier = 10, 6, "large"
+    if remaining is not None and remaining < ANALYSIS_FULL_SECONDS:
+        competitor_max, insights_max = 5, 0
+        deadline_stats.degrade("analysis", "reduced_search", remaining)
+    if remaining is not None and remaining < ANALYSIS_LARGE_TIER_SECONDS:
+        tier = "fast"
+        deadline_stats.degrade("analysis", "fast_tier", remaining)
+    search_timeout = _search_timeout(remaining)
+    if search_timeout is not None and search_timeout < MIN_SEARCH_SECONDS:
+        competitor_max = insights_max = 0
+        deadline_stats.degrade("analysis", "skipped_search", remaining)
     
-    insights_query = f"market trends OR industry analysis OR demand signals for: {user_request}"
-    insights_results = tavily.search(query=insights_query, max_results=6)
+    async def search(query: str, max_results: int) -> dict:
+        if not max_results:
+            return {"results": []}
+        return await web_search(query, max_results=max_results, timeout=search_timeout)
     
-    # Format search results as context
-    competitors_context = "Web search results - Competitors & Alternatives:\n\n"
-    for r in competitor_results["results"]:
-        competitors_context += f"- {r['title']}\n  {r['content'][:300]}...\n  URL: {r['url']}\n\n"
+    # Tavily searches to provide real-world context, unless discovery already prefetched them
+    prefetched = await speculator.claim(state.get("session_id"), brief, wait=search_timeout)
+    if prefetched is not None:
+        competitor_results, insights_results = prefetched
+    else:
+        competitor_query, insights_query = research_queries(brief)
+        competitor_results, insights_results = await asyncio.gather(
+            search(competitor_query, competitor_max),
+            search(insights_query, insights_max),
+        )
     
-    insights_context = "Web search results - Market Trends & Insights:\n\n"
-    for r in insights_results["results"]:
-        insights_context += f"- {r['title']}\n  {r['content'][:300]}...\n  URL: {r['url']}\n\n"
+    # Merge, dedupe and rerank against everything the user said about the product
+    context = ResearchContextBuilder(user_request, ANALYSIS_CONTEXT_TOKEN_BUDGET) \
+        .add("Competitors & Alternatives", competitor_results["results"]) \
+        .add("Market Trends & Insights", insights_results["results"])
+    research_context = context.build() or NO_RESEARCH_CONTEXT
+    logger.info(f"analysis research context: {context.stats}")
     
     # Enhance the original prompt with search context
     base_prompt = analysis_prompt(user_request)
@@ -53,18 +127,18 @@ def analysis_node(state: MarketingState):
 
 ### Additional Research Context (MANDATORY: use these results to identify real competitors, extract accurate descriptions/positioning, and cite the provided URLs as references):
 
-{competitors_context}
-
-{insights_context}
+{research_context}
 
 Prioritize information from these sources. If a claim cannot be supported by the provided results, state "No reliable public reference available."
 """
     
-    resp = LLM.with_structured_output(ProductAnalysis).invoke(enhanced_prompt)
-    return {"analysis": resp}
+    resp = await structured_llm(
+        ProductAnalysis, enhanced_prompt, node="analysis", tier=tier, timeout=time_left(state.get("deadline"))
+    )
+    return {"analysis": resp, "research_urls": sorted(context.packed_urls)}
 
 
-def strategy_node(state: MarketingState):
+async def strategy_node(state: MarketingState):
     analysis: ProductAnalysis = state["analysis"]
     
     product_summary = analysis.product_summary or state["user_message"]
@@ -74,13 +148,28 @@ Product Analysis:
 {analysis.model_dump_json(indent=2)}
 """
     
+    remaining = time_left(state.get("deadline"))
+    case_max, tier = 8, "large"
+    if remaining is not None and remaining < STRATEGY_FULL_SECONDS:
+        case_max = 4
+        deadline_stats.degrade("strategy", "reduced_search", remaining)
+    if remaining is not None and remaining < STRATEGY_LARGE_TIER_SECONDS:
+        tier = "fast"
+        deadline_stats.degrade("strategy", "fast_tier", remaining)
+    search_timeout = _search_timeout(remaining)
+    if search_timeout is not None and search_timeout < MIN_SEARCH_SECONDS:
+        case_max = 0
+        deadline_stats.degrade("strategy", "skipped_search", remaining)
+    
     # Additional Tavily search for real-world marketing examples
     case_query = f"successful marketing strategy OR growth case study OR 90-day launch plan for {product_summary}"
-    case_results = tavily.search(query=case_query, max_results=8)
+    case_results = await web_search(case_query, max_results=case_max, timeout=search_timeout) if case_max else {"results": []}
     
-    case_context = "Web search results - Relevant Marketing Case Studies & Examples:\n\n"
-    for r in case_results["results"]:
-        case_context += f"- {r['title']}\n  {r['content'][:300]}...\n  URL: {r['url']}\n\n"
+    # Skip sources the analysis already cited; the analysis JSON carries them forward
+    context = ResearchContextBuilder(product_summary, STRATEGY_CONTEXT_TOKEN_BUDGET) \
+        .add("Relevant Marketing Case Studies & Examples", case_results["results"])
+    case_context = context.build(exclude_urls=set(state.get("research_urls") or [])) or NO_RESEARCH_CONTEXT
+    logger.info(f"strategy research context: {context.stats}")
     
     base_prompt = marketing_strategy_planner(combined_input)
     enhanced_prompt = f"""{base_prompt}
@@ -92,11 +181,8 @@ Product Analysis:
 Use the provided URLs in the References section where applicable.
 """
     
-    resp = LLM.with_structured_output(MarketingStrategy).invoke(enhanced_prompt)
-    return {"strategy": resp}
-
-    resp = LLM.with_structured_output(MarketingStrategy).invoke(
-        marketing_strategy_planner(combined_input)
+    resp = await structured_llm(
+        MarketingStrategy, enhanced_prompt, node="strategy", tier=tier, timeout=time_left(state.get("deadline"))
     )
     return {"strategy": resp}
 
@@ -124,3 +210,13 @@ graph.add_edge("analysis", "strategy")
 graph.add_edge("strategy", END)
 
 marketing_agent = graph.compile()
+
+# Generation-only graph (no discovery dialogue), used for batch runs
+generation_graph = StateGraph(MarketingState)
+generation_graph.add_node("analysis", analysis_node)
+generation_graph.add_node("strategy", strategy_node)
+generation_graph.set_entry_point("analysis")
+generation_graph.add_edge("analysis", "strategy")
+generation_graph.add_edge("strategy", END)
+
+generation_agent = generation_graph.compile()
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Process-wide HTTP client pool shared by the LLM (Groq) and search (Tavily) clients.
+
+One keep-alive pool (HTTP/2 when the `h2` package is installed) replaces the
+per-SDK connection handling, so concurrent strategy generation reuses warm TLS
+connections instead of opening new ones. Host lookups go through a small TTL
+cache in the network backend. The app lifespan closes the pool on shutdown.
+"""
+import logging
+import os
+import socket
+import time
+from typing import List
+
+import anyio
+import httpcore
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "40"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_DNS_CACHE_TTL_SECONDS = float(os.getenv("HTTP_DNS_CACHE_TTL_SECONDS", "300"))
+
+
+class PoolStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.connect_fallbacks = 0
+
+    def snapshot(self) -> dict:
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            "dns_cache_hits": self.dns_hits,
+            "dns_cache_misses": self.dns_misses,
+            "connect_fallbacks": self.connect_fallbacks,
+        }
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """Resolves hosts through a TTL cache, then connects by IP.
+
+    Every resolved address is cached, in resolver order, and tried in turn,
+    keeping the multi-record and IPv6 -> IPv4 fallback of a normal lookup; an
+    address that answered is moved to the front for the next connection.
+    TLS still verifies against the original hostname: httpcore passes the
+    request host to start_tls separately from the address we connect to.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl_seconds: float, stats: PoolStats):
+        self._backend = backend
+        self._ttl = ttl_seconds
+        self._stats = stats
+        self._cache = {}  # (host, port) -> ([address, ...], expires_at)
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        cached = self._cache.get((host, port))
+        if cached and cached[1] > time.monotonic():
+            self._stats.dns_hits += 1
+            return cached[0]
+        self._stats.dns_misses += 1
+        infos = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (addresses, time.monotonic() + self._ttl)
+        return addresses
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await self._resolve(host, port)
+        self._stats.connections_opened += 1
+        for index, address in enumerate(addresses):
+            try:
+                stream = await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if index == len(addresses) - 1:
+                    # Every record failed; forget them so the next attempt re-resolves
+                    self._cache.pop((host, port), None)
+                    raise
+                self._stats.connect_fallbacks += 1
+                continue
+            if index:
+                addresses.insert(0, addresses.pop(index))
+            return stream
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, limits: httpx.Limits, **kwargs):
+        super().__init__(limits=limits, http2=HTTP2_AVAILABLE, **kwargs)
+        # httpx doesn't expose the network backend, so rebuild its httpcore pool with ours
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=HTTP2_AVAILABLE,
+            network_backend=CachingDNSBackend(httpcore.AnyIOBackend(), HTTP_DNS_CACHE_TTL_SECONDS, stats),
+        )
+
+
+class HTTPPool:
+    def __init__(self):
+        self.stats = PoolStats()
+        self._limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        # Created once: the SDK clients keep a reference to these exact objects
+        self.async_client = httpx.AsyncClient(
+            transport=PooledTransport(self.stats, self._limits),
+            timeout=httpx.Timeout(None, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            event_hooks={"request": [self._count_request]},
+        )
+        # Only used if something calls the LLM synchronously; shares the same limits
+        self.sync_client = httpx.Client(
+            limits=self._limits,
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(None, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        )
+
+    async def _count_request(self, request: httpx.Request) -> None:
+        self.stats.requests += 1
+
+    async def aclose(self) -> None:
+        await self.async_client.aclose()
+        self.sync_client.close()
+        logger.info(f"HTTP pool closed: {self.stats.snapshot()}")
+
+    def snapshot(self) -> dict:
+        return self.stats.snapshot()
+
+
+http_pool = HTTPPool()
@@ -0,0 +1,259 @@
+"""
+Resilient gateway in front of the chat models: per-call deadlines, failover
+across a configured model list, and hedged requests for interactive calls.
+
+A hedge is a duplicate request sent to the next model once the primary has
+been outstanding for longer than the recent p95 latency of that kind of call;
+whichever finishes first wins and the loser is cancelled.
+
+Each model sits behind its own circuit breaker: transient provider errors are
+retried with jittered backoff, and a model whose breaker is open fails
+immediately so the call fails over to the next one without waiting.
+
+Malformed structured output is repaired locally where possible (see
+agent/structured_output.py) before an attempt is counted as failed.
+
+Every attempt (primary, failover or hedge) holds a slot of the shared LLM
+scheduler (agent/scheduler.py) while it talks to the provider, so calls are
+admitted by priority class; hedge delays are measured from admission.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Callable, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from agent.resilience import RetryPolicy, breaker, call_async
+from agent.scheduler import LLMScheduler, current_priority, llm_scheduler
+from agent.structured_output import OutputRepairer, RepairStats, failed_generation
+from agent.usage import extract_usage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        models: List,
+        model_names: List[str],
+        timeout_seconds: float = 60.0,
+        interactive_timeout_seconds: float = 20.0,
+        max_attempts: int = 3,
+        hedge_initial_delay_seconds: float = 3.0,
+        hedge_min_delay_seconds: float = 0.5,
+        hedge_min_samples: int = 20,
+        retry_policy: Optional[RetryPolicy] = None,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        if not models:
+            raise ValueError("LLMGateway needs at least one model")
+        self.models = models
+        self.model_names = model_names
+        self.timeout_seconds = timeout_seconds
+        self.interactive_timeout_seconds = interactive_timeout_seconds
+        self.max_attempts = max_attempts
+        self.hedge_initial_delay_seconds = hedge_initial_delay_seconds
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self.retry_policy = retry_policy or RetryPolicy(is_failure=lambda e: False, max_retries=0)
+        self.scheduler = scheduler or llm_scheduler
+        self._breakers = [breaker(f"llm:{name}") for name in model_names]
+        self.repair_stats = RepairStats()
+        self._repairer = OutputRepairer(self.repair_stats)
+
+        self._latency = defaultdict(LatencyWindow)  # schema name -> successful latencies
+        self._runnables = {}  # (model index, schema) -> structured-output runnable
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.failovers = 0
+        self.timeouts = 0
+        self.errors = defaultdict(int)  # model name -> count
+        self.wins = defaultdict(int)  # model name -> count
+
+    def hedge_delay(self, schema_name: str) -> float:
+        window = self._latency[schema_name]
+        if len(window) < self.hedge_min_samples:
+            return self.hedge_initial_delay_seconds
+        return max(self.hedge_min_delay_seconds, window.percentile(0.95))
+
+    def _runnable(self, index: int, schema: Type[T]):
+        """Structured-output runnables are built once per model and schema"""
+        runnable = self._runnables.get((index, schema))
+        if runnable is None:
+            runnable = self._runnables[(index, schema)] = self.models[index].with_structured_output(
+                schema, include_raw=True
+            )
+        return runnable
+
+    async def _invoke(self, index: int, schema: Type[T], prompt: str, on_usage: Optional[Callable]) -> dict:
+        runnable = self._runnable(index, schema)
+        try:
+            output = await call_async(self._breakers[index], self.retry_policy, lambda: runnable.ainvoke(prompt))
+        except Exception as e:
+            # The provider rejected a malformed tool call but sent back what it generated
+            text = failed_generation(e)
+            if text is None:
+                raise
+            return {"raw": None, "parsed": None, "parsing_error": e, "failed_generation": text}
+        # include_raw keeps the AIMessage so token usage survives parsing
+        if on_usage is not None and output.get("raw") is not None:
+            on_usage(extract_usage(output["raw"]))
+        return output
+
+    async def _attempt(
+        self, index: int, schema: Type[T], prompt: str, on_usage: Optional[Callable], priority: str,
+        admitted: Optional[asyncio.Event] = None,
+    ) -> T:
+        async with self.scheduler.slot(priority):
+            if admitted is not None:
+                admitted.set()
+            return await self._scheduled_attempt(index, schema, prompt, on_usage)
+
+    async def _scheduled_attempt(self, index: int, schema: Type[T], prompt: str, on_usage: Optional[Callable]) -> T:
+        # Timed from admission so queue wait doesn't inflate the hedge delay
+        start = time.monotonic()
+        output = await self._invoke(index, schema, prompt, on_usage)
+        self.repair_stats.responses += 1
+        if output.get("parsing_error") is None and output.get("parsed") is not None:
+            self.repair_stats.clean += 1
+            self._latency[schema.__name__].record(time.monotonic() - start)
+            return output["parsed"]
+
+        async def request_patch(patch_schema, patch_prompt):
+            patch = await self._invoke(index, patch_schema, patch_prompt, on_usage)
+            if patch.get("parsed") is None:
+                raise ValueError(f"Patch for {schema.__name__} did not parse: {patch.get('parsing_error')}")
+            return patch["parsed"]
+
+        try:
+            return await self._repairer.repair(schema, output, request_patch)
+        except Exception as e:
+            self.repair_stats.full_retries += 1
+            raise ValueError(
+                f"Structured output did not parse as {schema.__name__}: {output.get('parsing_error')} (repair: {e})"
+            ) from e
+
+    async def ainvoke_structured(
+        self,
+        schema: Type[T],
+        prompt: str,
+        interactive: bool = False,
+        timeout: Optional[float] = None,
+        on_usage: Optional[Callable[[dict], None]] = None,
+        priority: Optional[str] = None,
+    ) -> T:
+        """Run a structured call with failover, hedging interactive calls.
+
+        `priority` is the scheduler class; defaults to "interactive" for
+        interactive calls, else to the class set by llm_context().
+        `on_usage` receives the token usage of every attempt that got a response.
+        Raises asyncio.TimeoutError once the deadline passes, or the last
+        provider error if every attempt failed.
+        """
+        loop = asyncio.get_running_loop()
+        if timeout is None:
+            timeout = self.interactive_timeout_seconds if interactive else self.timeout_seconds
+        deadline = loop.time() + timeout
+        hedge_at = None  # armed once the primary is admitted
+        priority = priority or ("interactive" if interactive else current_priority())
+        self.calls += 1
+
+        pending = {}  # task -> (model index, kind)
+        attempts = 0
+        last_error: Optional[BaseException] = None
+
+        def launch(kind: str, admitted: Optional[asyncio.Event] = None) -> None:
+            nonlocal attempts
+            index = attempts % len(self.models)
+            attempts += 1
+            task = asyncio.ensure_future(self._attempt(index, schema, prompt, on_usage, priority, admitted))
+            pending[task] = (index, kind)
+
+        # The hedge clock starts when the primary gets a scheduler slot: hedging a call
+        # that is still queued would only add to the queue when it is already long
+        primary_admitted = asyncio.Event()
+        admission = asyncio.ensure_future(primary_admitted.wait()) if interactive else None
+        launch("primary", primary_admitted)
+        try:
+            while pending:
+                wake_at = min(deadline, hedge_at) if hedge_at else deadline
+                waiting = set(pending) | ({admission} if admission is not None else set())
+                done, _ = await asyncio.wait(
+                    waiting, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if admission in done:
+                    hedge_at = loop.time() + self.hedge_delay(schema.__name__)
+                    admission = None
+                for task in done & pending.keys():
+                    index, kind = pending.pop(task)
+                    name = self.model_names[index]
+                    if task.exception() is None:
+                        self.wins[name] += 1
+                        if kind == "hedge":
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+                    self.errors[name] += 1
+                    logger.warning(f"LLM call to {name} failed ({kind}): {last_error!r}")
+                    if attempts < self.max_attempts and loop.time() < deadline:
+                        self.failovers += 1
+                        launch("failover")
+
+                now = loop.time()
+                if now >= deadline:
+                    break
+                if hedge_at and now >= hedge_at:
+                    hedge_at = None
+                    if attempts < self.max_attempts:
+                        self.hedges_fired += 1
+                        launch("hedge")
+
+            if pending or last_error is None:
+                self.timeouts += 1
+                raise asyncio.TimeoutError(f"LLM call exceeded {timeout:.1f}s deadline")
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if admission is not None:
+                admission.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "models": self.model_names,
+            "calls": self.calls,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+            "timeouts": self.timeouts,
+            "errors": dict(self.errors),
+            "wins": dict(self.wins),
+            "structured_output": self.repair_stats.snapshot(),
+            "p95_seconds": {
+                name: round(window.percentile(0.95), 3)
+                for name, window in self._latency.items()
+                if len(window)
+            },
+        }
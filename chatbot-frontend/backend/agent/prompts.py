@@ -1,19 +1,3 @@
-def intent_prompt(user_message: str):
-    return f"""
-You are an intent detection agent.
-
-Classify the user message into one of the following:
-- CASUAL_CHAT
-- MARKETING_STRATEGY_REQUEST
-
-User message:
-{user_message}
-
-Respond with ONLY the intent label.
-"""
-
-
-
 def analysis_prompt(user_request: str):
     ANALYSIS_PROMPT = f"""
 You are an **Analysis Agent** with expertise in product research, market analysis, and competitive intelligence.
@@ -192,3 +176,31 @@ Based on the conversation history, decide what to do next.
 If you have gathered all necessary information and the user has confirmed it (Phase 3 complete), set 'should_generate_strategy' to True.
 Otherwise, set 'should_generate_strategy' to False and provide a 'response_to_user' to continue the conversation (ask next question, greet, etc).
 """
+
+
+def chunk_summary_prompt(chunk: str, index: int, total: int):
+    return f"""
+You are summarizing part {index} of {total} of a document a user uploaded for marketing research.
+
+Summarize ONLY what this part says. Keep concrete facts: product names, audiences,
+prices, numbers, dates, competitors and claims. Do not speculate about the rest
+of the document and do not add advice.
+
+--------------------
+{chunk}
+--------------------
+"""
+
+
+def document_summary_prompt(section_summaries: str):
+    return f"""
+You are combining summaries of consecutive sections of one document into a single summary.
+
+Write one coherent summary of the whole document (at most two short paragraphs)
+and the key points a marketing strategist would need. Merge repeated points,
+keep concrete facts and numbers, and drop anything only relevant to one section's wording.
+
+--------------------
+{section_summaries}
+--------------------
+"""
@@ -0,0 +1,168 @@
+"""
+Circuit breakers and bounded, jittered retries for external dependencies
+(Groq models, Tavily, Supabase).
+
+A breaker opens after `failure_threshold` consecutive failures and rejects
+calls immediately (CircuitOpenError) until `reset_timeout` has passed; then a
+single trial call is let through (half-open) and its outcome decides whether
+the breaker closes again or re-opens.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT_SECONDS = float(os.getenv("BREAKER_RESET_TIMEOUT_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()  # Supabase calls run in worker threads
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            if self.state == "open":
+                elapsed = time.monotonic() - self.opened_at
+                if elapsed < self.reset_timeout:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout - elapsed)
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+            self.consecutive_failures = 0
+            if self.state != "closed":
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                    logger.warning(f"Circuit '{self.name}' opened after {self.consecutive_failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, **self.stats}
+
+
+class RetryPolicy:
+    """Which errors count against a breaker, which of those are safe to retry, and how often"""
+
+    def __init__(
+        self,
+        is_failure: Callable[[BaseException], bool],
+        is_retryable: Optional[Callable[[BaseException], bool]] = None,
+        max_retries: int = 2,
+        base_delay: float = 0.25,
+        max_delay: float = 4.0,
+    ):
+        self.is_failure = is_failure
+        self.is_retryable = is_retryable or is_failure
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        return attempt < self.max_retries and self.is_retryable(error)
+
+    def delay(self, attempt: int) -> float:
+        """Capped exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT_SECONDS)
+    return _breakers[name]
+
+
+def breakers_snapshot() -> dict:
+    return {name: b.snapshot() for name, b in _breakers.items()}
+
+
+async def call_async(circuit: CircuitBreaker, policy: RetryPolicy, fn: Callable):
+    """Await fn() through the breaker, retrying transient failures with jitter"""
+    attempt = 0
+    while True:
+        circuit.before_call()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Lost a hedge race or hit a deadline: says nothing about provider health
+            circuit.release_trial()
+            raise
+        except Exception as e:
+            if not policy.is_failure(e):
+                # Caller-side errors (bad request, unparseable output) don't trip the breaker
+                circuit.record_success()
+                raise
+            circuit.record_failure()
+            if not policy.should_retry(e, attempt):
+                raise
+            await asyncio.sleep(policy.delay(attempt))
+            attempt += 1
+            continue
+        circuit.record_success()
+        return result
+
+
+def call_sync(circuit: CircuitBreaker, policy: RetryPolicy, fn: Callable):
+    """Blocking counterpart of call_async, for Supabase calls already running in a worker thread"""
+    attempt = 0
+    while True:
+        circuit.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            if not policy.is_failure(e):
+                circuit.record_success()
+                raise
+            circuit.record_failure()
+            if not policy.should_retry(e, attempt):
+                raise
+            time.sleep(policy.delay(attempt))
+            attempt += 1
+            continue
+        circuit.record_success()
+        return result
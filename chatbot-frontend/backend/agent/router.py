@@ -0,0 +1,98 @@
+"""
+Tiered routing for chat turns.
+
+- local: keyword rules answer obvious greetings/thanks and the confirmation
+  that ends discovery, with no LLM call at all
+- fast:  a small model runs the discovery conversation (conversation_node)
+- large: the big model is reserved for analysis_node and strategy_node
+"""
+import os
+import re
+from collections import defaultdict
+from typing import List, Optional
+
+from agent.schemas import ConversationResponse
+
+TIERS = ("local", "fast", "large")
+
+GREETINGS = {
+    "hi", "hello", "hey", "hiya", "yo", "howdy", "hi there", "hello there", "hey there",
+    "good morning", "good afternoon", "good evening",
+}
+THANKS = {
+    "thanks", "thank you", "thx", "ty", "cheers", "thanks a lot", "thank you so much",
+    "many thanks", "great thanks", "ok thanks", "okay thanks",
+}
+CONFIRMATIONS = {
+    "yes", "yep", "yeah", "yup", "correct", "exactly", "right", "thats right", "that is right",
+    "yes thats right", "yes correct", "yes exactly", "looks good", "sounds good", "perfect",
+    "all correct", "spot on", "you got it", "yes you got it", "go ahead", "yes go ahead",
+}
+# Phase 3 of conversational_consultant_prompt ends with this question
+CONFIRMATION_QUESTION = "did i get this right"
+
+WARM_UP_REPLY = (
+    "Hey! I'm here to help you put together a practical 90-day marketing plan. "
+    "To start, what's the product or service you're working on?"
+)
+THANKS_REPLY = "You're welcome! Anything else you'd like to dig into or adjust?"
+
+
+def _normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", "", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def classify_turn(user_message: str, history: List[dict]) -> Optional[ConversationResponse]:
+    """Answer obvious turns locally; None means "ask the fast model"."""
+    message = _normalize(user_message)
+    last_assistant = next(
+        (msg["content"] for msg in reversed(history) if msg.get("role") == "assistant"), ""
+    )
+
+    if message in CONFIRMATIONS and CONFIRMATION_QUESTION in last_assistant.lower():
+        return ConversationResponse(should_generate_strategy=True, response_to_user=None)
+    if message in GREETINGS and not history:
+        return ConversationResponse(should_generate_strategy=False, response_to_user=WARM_UP_REPLY)
+    if message in THANKS:
+        return ConversationResponse(should_generate_strategy=False, response_to_user=THANKS_REPLY)
+    return None
+
+
+class TierStats:
+    """Latency, token usage and cost per tier"""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.input_tokens = defaultdict(int)
+        self.output_tokens = defaultdict(int)
+        self.price_per_million_tokens = {
+            tier: float(os.getenv(f"LLM_{tier.upper()}_PRICE_PER_MILLION_TOKENS", "0"))
+            for tier in TIERS
+        }
+
+    def record(self, tier: str, seconds: float) -> None:
+        self.calls[tier] += 1
+        self.seconds[tier] += seconds
+
+    def record_usage(self, tier: str, usage: dict) -> None:
+        self.input_tokens[tier] += usage.get("input_tokens", 0)
+        self.output_tokens[tier] += usage.get("output_tokens", 0)
+
+    def snapshot(self) -> dict:
+        report = {}
+        for tier in TIERS:
+            calls = self.calls[tier]
+            tokens = self.input_tokens[tier] + self.output_tokens[tier]
+            report[tier] = {
+                "calls": calls,
+                "avg_latency_seconds": round(self.seconds[tier] / calls, 4) if calls else 0.0,
+                "input_tokens": self.input_tokens[tier],
+                "output_tokens": self.output_tokens[tier],
+                "cost_usd": round(tokens / 1_000_000 * self.price_per_million_tokens[tier], 6),
+            }
+        return report
+
+
+tier_stats = TierStats()
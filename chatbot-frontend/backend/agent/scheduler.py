@@ -0,0 +1,247 @@
+"""
+Priority-aware admission of LLM calls against the shared provider rate limit.
+
+Every model attempt takes a slot from the scheduler before it reaches the
+provider. Slots are bounded globally (LLM_SCHEDULER_MAX_CONCURRENCY) and per
+class, and a freed slot goes to the highest-priority class that has room:
+
+- interactive: discovery replies on the chat critical path
+- generation:  analysis and full strategy generation for a chat turn
+- batch:       batch strategies, document summaries, speculative work
+
+Class limits below the global limit keep headroom: interactive calls always
+find a slot even while generations saturate their share, and batch work can't
+crowd out chat turns. Within a class, users are served round-robin, so one
+user's burst of generations queues behind itself, not in front of everyone.
+Waiters older than LLM_SCHEDULER_AGING_SECONDS move up one class per period,
+so batch work still progresses under sustained interactive load.
+
+The caller's class and user come from llm_context() (set by routes and
+background jobs) unless passed explicitly.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+PRIORITY_CLASSES = ("interactive", "generation", "batch")  # highest first
+
+LLM_SCHEDULER_MAX_CONCURRENCY = int(os.getenv("LLM_SCHEDULER_MAX_CONCURRENCY", "12"))
+LLM_SCHEDULER_CLASS_LIMITS = {
+    "interactive": int(os.getenv("LLM_SCHEDULER_INTERACTIVE_LIMIT", "10")),
+    "generation": int(os.getenv("LLM_SCHEDULER_GENERATION_LIMIT", "6")),
+    "batch": int(os.getenv("LLM_SCHEDULER_BATCH_LIMIT", "4")),
+}
+LLM_SCHEDULER_AGING_SECONDS = float(os.getenv("LLM_SCHEDULER_AGING_SECONDS", "30"))
+
+ANONYMOUS = "-"
+
+_current_class: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_class", default=None)
+_current_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_user", default=None)
+
+
+@contextmanager
+def llm_context(user_id: Optional[str] = None, priority: Optional[str] = None):
+    """Attribute LLM calls made inside the block to `user_id` and, if given, a priority class"""
+    if priority is not None and priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown LLM priority class '{priority}'")
+    tokens = []
+    if user_id is not None:
+        tokens.append((_current_user, _current_user.set(user_id)))
+    if priority is not None:
+        tokens.append((_current_class, _current_class.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_priority(default: str = "generation") -> str:
+    return _current_class.get() or default
+
+
+def current_user() -> str:
+    return _current_user.get() or ANONYMOUS
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "user_id", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: str, user_id: str):
+        self.future = future
+        self.priority = priority
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+
+
+class _ClassQueue:
+    """Per-user FIFOs served round-robin"""
+
+    def __init__(self):
+        self.users: "OrderedDict[str, deque[_Waiter]]" = OrderedDict()
+        self.size = 0
+
+    def push(self, waiter: _Waiter) -> None:
+        self.users.setdefault(waiter.user_id, deque()).append(waiter)
+        self.size += 1
+
+    def oldest(self) -> Optional[_Waiter]:
+        return min((queue[0] for queue in self.users.values()), key=lambda w: w.enqueued_at, default=None)
+
+    def pop(self) -> _Waiter:
+        user_id, queue = next(iter(self.users.items()))
+        waiter = queue.popleft()
+        del self.users[user_id]
+        if queue:
+            self.users[user_id] = queue  # back of the rotation
+        self.size -= 1
+        return waiter
+
+    def remove(self, waiter: _Waiter) -> None:
+        queue = self.users.get(waiter.user_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.size -= 1
+            if not queue:
+                del self.users[waiter.user_id]
+
+
+class _WaitStats:
+    def __init__(self, size: int = 500):
+        self.samples = deque(maxlen=size)
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.admitted += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = LLM_SCHEDULER_MAX_CONCURRENCY,
+        class_limits: Optional[Dict[str, int]] = None,
+        aging_seconds: float = LLM_SCHEDULER_AGING_SECONDS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.class_limits = dict(class_limits or LLM_SCHEDULER_CLASS_LIMITS)
+        self.aging_seconds = aging_seconds
+        self._queues = {priority: _ClassQueue() for priority in PRIORITY_CLASSES}
+        self._running = defaultdict(int)  # class -> slots held
+        self._stats = {priority: _WaitStats() for priority in PRIORITY_CLASSES}
+        self.promotions = 0
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def _has_room(self, priority: str) -> bool:
+        return self.running < self.max_concurrency and self._running[priority] < self.class_limits[priority]
+
+    def _effective_rank(self, priority: str, now: float) -> int:
+        rank = PRIORITY_CLASSES.index(priority)
+        oldest = self._queues[priority].oldest()
+        if oldest is not None and self.aging_seconds > 0:
+            rank -= int((now - oldest.enqueued_at) // self.aging_seconds)
+        return rank
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, best effective class first"""
+        while self.running < self.max_concurrency:
+            now = time.monotonic()
+            candidates = [p for p in PRIORITY_CLASSES if self._queues[p].size and self._has_room(p)]
+            if not candidates:
+                return
+            # min() keeps declaration order on ties, so the nominal priority wins those
+            priority = min(candidates, key=lambda p: self._effective_rank(p, now))
+            if priority != candidates[0]:
+                self.promotions += 1
+            waiter = self._queues[priority].pop()
+            if waiter.future.done():
+                continue
+            self._running[priority] += 1
+            self._stats[priority].record(now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    async def acquire(self, priority: str, user_id: str) -> None:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown LLM priority class '{priority}'")
+        if self._has_room(priority) and not self._queues[priority].size and not self._higher_waiting(priority):
+            self._running[priority] += 1
+            self._stats[priority].record(0.0)
+            return
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, user_id)
+        self._queues[priority].push(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled: give the slot back
+                self.release(priority)
+            else:
+                self._queues[priority].remove(waiter)
+            raise
+
+    def _higher_waiting(self, priority: str) -> bool:
+        rank = PRIORITY_CLASSES.index(priority)
+        return any(self._queues[p].size and self._has_room(p) for p in PRIORITY_CLASSES[:rank])
+
+    def release(self, priority: str) -> None:
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def slot(self, priority: Optional[str] = None, user_id: Optional[str] = None) -> "_Slot":
+        """`async with scheduler.slot(...)`: wait for and hold one provider slot"""
+        return _Slot(self, priority or current_priority(), user_id or current_user())
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "promotions": self.promotions,
+            "classes": {
+                priority: {
+                    "limit": self.class_limits[priority],
+                    "running": self._running[priority],
+                    "queued": self._queues[priority].size,
+                    "queued_users": len(self._queues[priority].users),
+                    "admitted": stats.admitted,
+                    "avg_wait_seconds": round(stats.total_wait / stats.admitted, 4) if stats.admitted else 0.0,
+                    "p95_wait_seconds": round(stats.percentile(0.95), 4),
+                    "max_wait_seconds": round(stats.max_wait, 4),
+                }
+                for priority, stats in self._stats.items()
+            },
+        }
+
+
+class _Slot:
+    def __init__(self, scheduler: LLMScheduler, priority: str, user_id: str):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.user_id = user_id
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.priority, self.user_id)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release(self.priority)
+
+
+llm_scheduler = LLMScheduler()
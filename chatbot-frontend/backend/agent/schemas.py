@@ -70,3 +70,6 @@ class MarketingStrategy(BaseModel):
 
 # --------------
 
+class DocumentSummary(BaseModel):
+    summary: str = Field(description="Concise summary of the text, in plain prose")
+    key_points: List[str] = Field(description="Most important facts, figures and claims")
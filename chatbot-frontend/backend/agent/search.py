@@ -0,0 +1,52 @@
+"""
+Minimal async Tavily search client running on the shared HTTP pool.
+
+Only `search` is used by the agent, so this speaks the REST API directly
+instead of letting the SDK manage its own connections. Requests go through
+the "tavily" circuit breaker with jittered retries on transient failures.
+"""
+import os
+from typing import Optional
+
+import httpx
+
+from agent.resilience import RetryPolicy, breaker, call_async
+
+TAVILY_API_BASE_URL = os.getenv("TAVILY_API_BASE_URL", "https://api.tavily.com")
+TAVILY_TIMEOUT_SECONDS = float(os.getenv("TAVILY_TIMEOUT_SECONDS", "20"))
+
+
+def _is_transient(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+TAVILY_RETRY_POLICY = RetryPolicy(
+    is_failure=_is_transient,
+    max_retries=int(os.getenv("TAVILY_MAX_RETRIES", "2")),
+)
+
+
+class TavilySearch:
+    def __init__(self, api_key: str, client: httpx.AsyncClient, base_url: str = TAVILY_API_BASE_URL):
+        self.api_key = api_key
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker("tavily")
+
+    async def _post_search(self, payload: dict, timeout: float) -> dict:
+        response = await self.client.post(
+            f"{self.base_url}/search",
+            json=payload,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def search(self, query: str, max_results: int = 5, timeout: Optional[float] = None, **options) -> dict:
+        """Raises CircuitOpenError without a request while Tavily is marked down"""
+        payload = {"query": query, "max_results": max_results, **options}
+        timeout = min(timeout, TAVILY_TIMEOUT_SECONDS) if timeout else TAVILY_TIMEOUT_SECONDS
+        return await call_async(self.breaker, TAVILY_RETRY_POLICY, lambda: self._post_search(payload, timeout))
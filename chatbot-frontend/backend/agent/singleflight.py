@@ -0,0 +1,42 @@
+"""
+Single-flight coalescing: concurrent calls with the same key share one in-flight task.
+"""
+import asyncio
+import hashlib
+import re
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def normalize_key(*parts) -> str:
+    """Case/whitespace-insensitive key for free-text inputs (queries, prompts)"""
+    normalized = "\x1f".join(re.sub(r"\s+", " ", str(part)).strip().lower() for part in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield so one caller giving up doesn't cancel the work for everyone else
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
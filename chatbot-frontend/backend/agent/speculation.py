@@ -0,0 +1,224 @@
+"""
+Speculative research: the competitor and market-trend searches of
+analysis_node, started in the background while discovery is still going.
+
+Users describe their product turns before they confirm the plan, so once the
+user side of the conversation carries SPECULATION_MIN_TERMS content terms,
+each discovery turn (re)starts the two searches for that chat session. When
+the strategy turn reaches analysis_node it claims them:
+- finished: used as is, and the whole search time is saved
+- still running: awaited (within the node's search budget), saving the part
+  that already ran
+- missing, failed or stale: analysis searches as before
+
+A speculation is restarted (and the old one cancelled) only when the brief
+gained more than SPECULATION_REFRESH_RATIO new terms, so answers like "low
+budget" or "US only" don't cost new searches. Results are kept per session in
+memory for SPECULATION_TTL_SECONDS; with several workers a turn that lands on
+another worker simply misses.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import List, Optional, Set, Tuple
+
+from agent.context_builder import _terms
+from agent.router import CONFIRMATIONS, GREETINGS, THANKS, _normalize
+from agent.tools import web_search
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_MIN_TERMS = int(os.getenv("SPECULATION_MIN_TERMS", "12"))
+SPECULATION_REFRESH_RATIO = float(os.getenv("SPECULATION_REFRESH_RATIO", "0.3"))
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "1800"))
+SPECULATION_MAX_SESSIONS = int(os.getenv("SPECULATION_MAX_SESSIONS", "1000"))
+SPECULATION_MAX_IN_FLIGHT = int(os.getenv("SPECULATION_MAX_IN_FLIGHT", "8"))
+SPECULATION_SEARCH_TIMEOUT_SECONDS = float(os.getenv("SPECULATION_SEARCH_TIMEOUT_SECONDS", "20"))
+
+# Search sizes of an undegraded analysis_node
+COMPETITOR_MAX_RESULTS = 10
+INSIGHTS_MAX_RESULTS = 6
+
+# Tavily works best with short queries; only searches use the shortened brief
+PRODUCT_BRIEF_MAX_CHARS = 300
+
+_SMALL_TALK = GREETINGS | THANKS | CONFIRMATIONS
+
+
+def product_description(messages: List[dict], user_message: str) -> str:
+    """What the user has said about the product: their messages minus small talk and confirmations"""
+    said = [msg["content"] for msg in messages if msg.get("role") == "user"] + [user_message]
+    return " ".join(re.sub(r"\s+", " ", text).strip() for text in said if _normalize(text) not in _SMALL_TALK)
+
+
+def product_brief(description: str) -> str:
+    """The description cut to PRODUCT_BRIEF_MAX_CHARS at a word boundary, for search queries and speculation matching"""
+    if len(description) <= PRODUCT_BRIEF_MAX_CHARS:
+        return description
+    return description[:PRODUCT_BRIEF_MAX_CHARS + 1].rsplit(" ", 1)[0].strip() or description[:PRODUCT_BRIEF_MAX_CHARS]
+
+
+def research_queries(brief: str) -> Tuple[str, str]:
+    """(competitor query, market-trend query); shared by analysis_node and speculation"""
+    return (
+        f"top competitors OR similar products OR alternatives to: {brief}",
+        f"market trends OR industry analysis OR demand signals for: {brief}",
+    )
+
+
+class Speculation:
+    def __init__(self, brief: str, terms: Set[str]):
+        self.brief = brief
+        self.terms = terms
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.results: Optional[Tuple[dict, dict]] = None
+        self.claimed = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+
+class SpeculationStats:
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.seconds_saved = 0.0
+
+    def snapshot(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        hits = self.counters["hits"]
+        return {
+            **self.counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "avg_seconds_saved_per_hit": round(self.seconds_saved / hits, 3) if hits else 0.0,
+        }
+
+
+class Speculator:
+    def __init__(self):
+        self._sessions: "OrderedDict[str, Speculation]" = OrderedDict()
+        self.stats = SpeculationStats()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(1 for s in self._sessions.values() if s.task is not None and not s.task.done())
+
+    def _get(self, session_id: str) -> Optional[Speculation]:
+        speculation = self._sessions.get(session_id)
+        if speculation is not None and time.monotonic() - speculation.started_at > SPECULATION_TTL_SECONDS:
+            self.discard(session_id, reason="expired")
+            return None
+        return speculation
+
+    def maybe_start(self, session_id: Optional[str], brief: str) -> bool:
+        """Called after each discovery turn; True if a new speculation was started"""
+        if not session_id:
+            return False
+        terms = set(_terms(brief))
+        if len(terms) < SPECULATION_MIN_TERMS:
+            return False
+        current = self._get(session_id)
+        if current is not None:
+            new_terms = len(terms - current.terms) / len(terms)
+            if new_terms <= SPECULATION_REFRESH_RATIO:
+                self._sessions.move_to_end(session_id)
+                return False
+            self.discard(session_id, reason="restarted")
+        if self.in_flight >= SPECULATION_MAX_IN_FLIGHT:
+            self.stats.counters["skipped_busy"] += 1
+            return False
+
+        speculation = Speculation(brief, terms)
+        speculation.task = asyncio.create_task(self._run(speculation))
+        self._sessions[session_id] = speculation
+        while len(self._sessions) > SPECULATION_MAX_SESSIONS:
+            self.discard(next(iter(self._sessions)), reason="evicted")
+        self.stats.counters["started"] += 1
+        return True
+
+    async def _run(self, speculation: Speculation) -> None:
+        competitor_query, insights_query = research_queries(speculation.brief)
+        try:
+            competitor, insights = await asyncio.gather(
+                web_search(competitor_query, max_results=COMPETITOR_MAX_RESULTS, timeout=SPECULATION_SEARCH_TIMEOUT_SECONDS),
+                web_search(insights_query, max_results=INSIGHTS_MAX_RESULTS, timeout=SPECULATION_SEARCH_TIMEOUT_SECONDS),
+            )
+        except Exception:
+            # Nobody may ever await this task; log here so the error isn't lost, and let claim() miss
+            logger.exception("Speculative research failed")
+            self.stats.counters["failed"] += 1
+            return
+        finally:
+            speculation.finished_at = time.monotonic()
+        if competitor.get("degraded") or insights.get("degraded"):
+            # Don't pin a degraded result; analysis gets its own chance to search
+            self.stats.counters["degraded"] += 1
+            return
+        speculation.results = (competitor, insights)
+        self.stats.counters["completed"] += 1
+
+    async def claim(self, session_id: Optional[str], brief: str, wait: Optional[float]) -> Optional[Tuple[dict, dict]]:
+        """Prefetched (competitor, insights) results for this brief, or None to search normally"""
+        if not session_id:
+            return None
+        speculation = self._get(session_id)
+        if speculation is None or not self._covers(speculation, brief):
+            self.stats.counters["misses"] += 1
+            return None
+
+        claimed_at = time.monotonic()
+        if not speculation.done:
+            try:
+                await asyncio.wait_for(asyncio.shield(speculation.task), wait)
+            except asyncio.TimeoutError:
+                self.stats.counters["misses"] += 1
+                self.stats.counters["miss_still_running"] += 1
+                return None
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # The speculation itself was discarded (restarted, evicted, expired) while we waited
+                self.stats.counters["misses"] += 1
+                self.stats.counters["miss_cancelled"] += 1
+                return None
+        if speculation.results is None:
+            self.stats.counters["misses"] += 1
+            return None
+
+        # Saved: the part of the search that ran before this turn needed it
+        saved = min(speculation.finished_at, claimed_at) - speculation.started_at
+        self.stats.counters["hits"] += 1
+        self.stats.counters["hits_in_flight" if speculation.finished_at > claimed_at else "hits_ready"] += 1
+        self.stats.seconds_saved += saved
+        speculation.claimed = True
+        logger.info(f"Speculative research hit for session {session_id}, saved {saved:.2f}s")
+        return speculation.results
+
+    def _covers(self, speculation: Speculation, brief: str) -> bool:
+        if speculation.brief == brief:
+            return True
+        terms = set(_terms(brief))
+        return bool(terms) and len(terms - speculation.terms) / len(terms) <= SPECULATION_REFRESH_RATIO
+
+    def discard(self, session_id: str, reason: str = "discarded") -> None:
+        speculation = self._sessions.pop(session_id, None)
+        if speculation is None:
+            return
+        if speculation.task is not None and not speculation.task.done():
+            speculation.task.cancel()
+            self.stats.counters["cancelled_in_flight"] += 1
+        elif speculation.results is not None and not speculation.claimed:
+            self.stats.counters["unused"] += 1
+        self.stats.counters[reason] += 1
+
+    def snapshot(self) -> dict:
+        return {"sessions": len(self._sessions), "in_flight": self.in_flight, **self.stats.snapshot()}
+
+
+speculator = Speculator()
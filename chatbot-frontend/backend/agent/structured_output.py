@@ -0,0 +1,308 @@
+"""
+Tolerant parsing and local repair of structured LLM output.
+
+When a structured call comes back malformed (broken JSON, a string where a
+list is expected, "Month 1" instead of month_1, a truncated tail...), the raw
+generation is parsed leniently and coerced towards the schema instead of
+throwing the whole generation away. Fields that still can't be recovered are
+re-requested on their own, e.g. a single MonthlyPlan, with the rest of the
+partial result as context. Only when that fails does the gateway fall back to
+a full retry.
+"""
+import ast
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, Field, ValidationError, create_model
+
+logger = logging.getLogger(__name__)
+
+# Re-requesting more than this share of the top-level fields is a regeneration in disguise
+MAX_PATCH_FIELD_RATIO = 0.5
+
+PatchRequester = Callable[[Type[BaseModel], str], Awaitable[BaseModel]]
+
+
+class RepairStats:
+    def __init__(self):
+        self.responses = 0
+        self.clean = 0
+        self.repaired_locally = 0
+        self.patched = 0
+        self.patch_calls = 0
+        self.full_retries = 0
+
+    def snapshot(self) -> dict:
+        malformed = self.responses - self.clean
+        recovered = self.repaired_locally + self.patched
+        return {
+            "responses": self.responses,
+            "clean": self.clean,
+            "repaired_locally": self.repaired_locally,
+            "patched": self.patched,
+            "patch_calls": self.patch_calls,
+            "full_retries": self.full_retries,
+            "repair_rate": round(recovered / malformed, 3) if malformed else 0.0,
+            "full_retry_rate": round(self.full_retries / self.responses, 3) if self.responses else 0.0,
+        }
+
+
+# ------------------- Tolerant parsing -------------------
+
+def failed_generation(error: BaseException) -> Optional[str]:
+    """Raw text of a generation the provider rejected (Groq's `tool_use_failed`)"""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+        text = body.get("failed_generation") if isinstance(body, dict) else None
+        if isinstance(text, str) and text.strip():
+            return text
+    return None
+
+
+def extract_payload(output: dict) -> Any:
+    """Best available raw arguments from an include_raw structured-output result"""
+    if output.get("failed_generation"):
+        return output["failed_generation"]
+    raw = output.get("raw")
+    tool_calls = getattr(raw, "tool_calls", None) or []
+    if tool_calls:
+        return tool_calls[0].get("args")
+    invalid_calls = getattr(raw, "invalid_tool_calls", None) or []
+    if invalid_calls:
+        return invalid_calls[0].get("args")
+    content = getattr(raw, "content", None)
+    return content if isinstance(content, str) and content.strip() else None
+
+
+def _close_truncated(text: str) -> str:
+    """Terminate an open string and close unbalanced brackets of a cut-off generation"""
+    closers = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]" and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r'[\s,:]+$', "", text)
+    text = re.sub(r',\s*"[^"]*"$', "", text)  # a key that never got its value
+    return text + "".join(reversed(closers))
+
+
+def loads_tolerant(text: str) -> Optional[dict]:
+    text = re.sub(r"```(?:json)?", "", text).strip()
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+    end = text.rfind("}")
+    no_trailing_commas = lambda s: re.sub(r",\s*([}\]])", r"\1", s)
+    candidates = [text[:end + 1]] if end != -1 else []
+    candidates += [no_trailing_commas(c) for c in candidates]
+    candidates.append(no_trailing_commas(_close_truncated(text)))
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate, strict=False)
+        except ValueError:
+            try:
+                # Python-literal style output: single quotes, True/None
+                parsed = ast.literal_eval(candidate)
+            except (ValueError, SyntaxError):
+                continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def _unwrap(payload: dict, schema: Type[BaseModel]) -> dict:
+    """Strip tool-call envelopes like {"name": ..., "arguments": {...}}"""
+    for key in ("arguments", "parameters", "args", schema.__name__):
+        inner = payload.get(key)
+        if isinstance(inner, dict) and not any(_norm(k) in _field_lookup(schema) for k in payload):
+            return inner
+    return payload
+
+
+# ------------------- Schema coercion -------------------
+
+def _norm(key: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+
+def _field_lookup(model: Type[BaseModel]) -> Dict[str, str]:
+    lookup = {}
+    for name, field in model.model_fields.items():
+        lookup[_norm(name)] = name
+        if field.alias:
+            lookup[_norm(field.alias)] = name
+    return lookup
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _split_items(text: str) -> List[str]:
+    text = text.strip()
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+            if isinstance(items, list):
+                return items
+        except ValueError:
+            pass
+    lines = text.splitlines() if "\n" in text else re.split(r";\s+", text)
+    items = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip() for line in lines]
+    return [item for item in items if item]
+
+
+def _coerce(value: Any, annotation) -> Any:
+    origin = get_origin(annotation)
+    if origin is Union:
+        if value is None:
+            return None
+        options = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _coerce(value, options[0]) if options else value
+    if _is_model(annotation):
+        if isinstance(value, str):
+            value = loads_tolerant(value) or value
+        return coerce_model(value, annotation) if isinstance(value, dict) else value
+    if origin in (list, List):
+        item_type = (get_args(annotation) or (Any,))[0]
+        if value is None:
+            return value
+        if isinstance(value, str):
+            value = _split_items(value)
+        elif isinstance(value, dict):
+            value = [value] if _is_model(item_type) else [f"{k}: {v}" for k, v in value.items()]
+        elif not isinstance(value, list):
+            value = [value]
+        return [_coerce(item, item_type) for item in value]
+    if annotation is str:
+        if isinstance(value, list):
+            return "\n".join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json.dumps(value)
+        if isinstance(value, (int, float, bool)):
+            return str(value)
+    if annotation is bool and isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return value
+
+
+def coerce_model(data: dict, model: Type[BaseModel]) -> dict:
+    """Map near-miss keys onto field names and coerce values towards field types"""
+    lookup = _field_lookup(model)
+    coerced = {}
+    for key, value in data.items():
+        name = lookup.get(_norm(key))
+        if name is not None and name not in coerced:
+            coerced[name] = _coerce(value, model.model_fields[name].annotation)
+    return coerced
+
+
+# ------------------- Repair -------------------
+
+_patch_models: Dict[Tuple[Type[BaseModel], Tuple[str, ...]], Type[BaseModel]] = {}
+
+
+def _patch_model(schema: Type[BaseModel], names: Tuple[str, ...]) -> Type[BaseModel]:
+    """A schema holding only the fields to re-request (built once per combination)"""
+    key = (schema, names)
+    if key not in _patch_models:
+        fields = {
+            name: (schema.model_fields[name].annotation, Field(description=schema.model_fields[name].description))
+            for name in names
+        }
+        _patch_models[key] = create_model(f"{schema.__name__}Patch", **fields)
+    return _patch_models[key]
+
+
+def _patch_prompt(schema: Type[BaseModel], partial: dict, names: Tuple[str, ...]) -> str:
+    wanted = "\n".join(
+        f"- {name}: {schema.model_fields[name].description or 'see schema'}" for name in names
+    )
+    return f"""You are completing a partially generated {schema.__name__}.
+
+Everything generated so far:
+{json.dumps(partial, indent=2, default=str)}
+
+Produce ONLY the following missing or invalid fields, consistent with the content above
+(same product, audience, tone and level of detail):
+{wanted}
+"""
+
+
+def _triage(schema: Type[BaseModel], data: dict, errors: List[dict]) -> Tuple[dict, List[str]]:
+    """Fix what can be fixed in place; return the top-level fields to re-request"""
+    refetch = []
+    for error in errors:
+        loc = error["loc"]
+        top = loc[0]
+        if not isinstance(top, str) or top not in schema.model_fields or top in refetch:
+            continue
+        annotation = schema.model_fields[top].annotation
+        if len(loc) == 2 and error["type"] == "missing" and isinstance(data.get(top), dict) and _is_model(annotation):
+            leaf = annotation.model_fields.get(loc[1])
+            if leaf is not None and get_origin(leaf.annotation) in (list, List):
+                # e.g. month_3.references left out: an empty list beats regenerating the month
+                data[top][loc[1]] = []
+                continue
+        if error["type"] == "missing" and get_origin(annotation) is Union and type(None) in get_args(annotation):
+            data[top] = None
+            continue
+        refetch.append(top)
+    return data, refetch
+
+
+class OutputRepairer:
+    def __init__(self, stats: RepairStats):
+        self.stats = stats
+
+    async def repair(self, schema: Type[BaseModel], output: dict, request_patch: PatchRequester) -> BaseModel:
+        """Recover a schema instance from a malformed response.
+
+        Raises ValueError when the output is beyond repair; the caller then
+        retries the full generation.
+        """
+        payload = extract_payload(output)
+        if isinstance(payload, str):
+            payload = loads_tolerant(payload)
+        if not isinstance(payload, dict):
+            raise ValueError(f"No {schema.__name__} arguments could be recovered from the response")
+
+        data = coerce_model(_unwrap(payload, schema), schema)
+        try:
+            result = schema.model_validate(data)
+            self.stats.repaired_locally += 1
+            return result
+        except ValidationError as e:
+            data, refetch = _triage(schema, data, e.errors())
+        if not refetch:
+            result = schema.model_validate(data)
+            self.stats.repaired_locally += 1
+            return result
+        if len(refetch) > len(schema.model_fields) * MAX_PATCH_FIELD_RATIO:
+            raise ValueError(f"{schema.__name__} is missing too much to patch: {refetch}")
+
+        names = tuple(sorted(refetch))
+        partial = {k: v for k, v in data.items() if k not in names}
+        logger.info(f"Re-requesting {names} of {schema.__name__}")
+        self.stats.patch_calls += 1
+        patch = await request_patch(_patch_model(schema, names), _patch_prompt(schema, partial, names))
+        result = schema.model_validate({**partial, **patch.model_dump()})
+        self.stats.patched += 1
+        return result
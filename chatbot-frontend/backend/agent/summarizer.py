@@ -0,0 +1,143 @@
+"""
+Map-reduce summarization of uploaded documents on the fast tier.
+
+The extracted text is split on paragraph/sentence boundaries into chunks of
+SUMMARY_CHUNK_CHARS, every chunk is summarized concurrently (at most
+SUMMARY_CONCURRENCY calls in flight across all documents), and the partial
+summaries are reduced into one. Reduction is a tree: when the partial
+summaries don't fit one prompt they are reduced in groups, level by level.
+
+Very long documents are capped at SUMMARY_MAX_CHUNKS evenly spaced chunks so
+a single upload can't burn an unbounded number of calls.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from typing import List
+
+from agent.prompts import chunk_summary_prompt, document_summary_prompt
+from agent.schemas import DocumentSummary
+from agent.singleflight import SingleFlight
+from agent.tools import structured_llm
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "12000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", "48"))
+
+# Shared by every document being summarized, so a burst of uploads can't flood the fast tier
+_slots = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+summary_flight = SingleFlight("document_summary")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_text(text: str, size: int = SUMMARY_CHUNK_CHARS) -> List[str]:
+    """Greedy packing of paragraphs (then sentences, then hard cuts) into chunks of at most `size`"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= size:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            pieces.extend(sentence[i:i + size] for i in range(0, len(sentence), size))
+
+    chunks, current = [], ""
+    for piece in filter(None, pieces):
+        if current and len(current) + len(piece) + 1 > size:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _spread(chunks: List[str], limit: int) -> List[str]:
+    if len(chunks) <= limit:
+        return chunks
+    step = len(chunks) / limit
+    return [chunks[int(i * step)] for i in range(limit)]
+
+
+def format_summary(summary: DocumentSummary) -> str:
+    points = "\n".join(f"- {point}" for point in summary.key_points)
+    return f"{summary.summary}\n\n{points}" if points else summary.summary
+
+
+class SummaryStats:
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.total_seconds = 0.0
+
+    def snapshot(self) -> dict:
+        summarized = self.counters["summarized"]
+        lookups = self.counters["cache_hits"] + self.counters["cache_misses"]
+        return {
+            "chunk_chars": SUMMARY_CHUNK_CHARS,
+            "concurrency": SUMMARY_CONCURRENCY,
+            **self.counters,
+            "cache_hit_ratio": round(self.counters["cache_hits"] / lookups, 3) if lookups else 0.0,
+            "avg_seconds": round(self.total_seconds / summarized, 3) if summarized else 0.0,
+        }
+
+
+summary_stats = SummaryStats()
+
+
+async def _summarize(prompt: str, node: str) -> DocumentSummary:
+    async with _slots:
+        return await structured_llm(DocumentSummary, prompt, node=node, tier="fast")
+
+
+async def _reduce(summaries: List[DocumentSummary]) -> DocumentSummary:
+    while len(summaries) > 1:
+        groups, current, size = [], [], 0
+        for summary in summaries:
+            text = format_summary(summary)
+            if current and size + len(text) > SUMMARY_CHUNK_CHARS:
+                groups.append(current)
+                current, size = [], 0
+            current.append(text)
+            size += len(text)
+        groups.append(current)
+        if len(groups) == len(summaries):
+            # Every partial summary fills a prompt on its own: pair them so the tree still shrinks
+            groups = [sum(groups[i:i + 2], []) for i in range(0, len(groups), 2)]
+        summary_stats.counters["reduce_calls"] += len(groups)
+        summaries = await asyncio.gather(*[
+            _summarize(document_summary_prompt("\n\n".join(
+                f"Section {i + 1}:\n{text}" for i, text in enumerate(group)
+            )), node="summarize_reduce")
+            for group in groups
+        ])
+    return summaries[0]
+
+
+async def summarize_text(text: str) -> str:
+    """Summary of a whole document; raises if any chunk can't be summarized"""
+    start = time.monotonic()
+    chunks = split_text(text)
+    if not chunks:
+        return ""
+    sampled = _spread(chunks, SUMMARY_MAX_CHUNKS)
+    summary_stats.counters["chunks"] += len(sampled)
+    summary_stats.counters["chunks_skipped"] += len(chunks) - len(sampled)
+    partials = await asyncio.gather(*[
+        _summarize(chunk_summary_prompt(chunk, i + 1, len(sampled)), node="summarize_chunk")
+        for i, chunk in enumerate(sampled)
+    ])
+    summary = await _reduce(list(partials))
+    summary_stats.counters["summarized"] += 1
+    summary_stats.total_seconds += time.monotonic() - start
+    return format_summary(summary)
@@ -0,0 +1,96 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional, Type, TypeVar
+
+import httpx
+from pydantic import BaseModel
+
+from agent.config import llm_gateway, fast_gateway, tavily
+from agent.router import tier_stats
+from agent.usage import record_usage
+from agent.singleflight import SingleFlight, normalize_key
+from agent.resilience import CircuitOpenError
+from agent.deadline import cap
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+search_flight = SingleFlight("tavily")
+llm_flight = SingleFlight("llm")
+
+GATEWAYS = {"fast": fast_gateway, "large": llm_gateway}
+
+# Result cache shared by everything running inside one `shared_cache()` block (e.g. a batch)
+_shared_cache: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("shared_cache", default=None)
+
+
+@contextmanager
+def shared_cache():
+    cache = {"hits": 0, "misses": 0, "entries": {}}
+    token = _shared_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _shared_cache.reset(token)
+
+
+async def _cached(key, flight: SingleFlight, fn):
+    cache = _shared_cache.get()
+    if cache is None:
+        return await flight.do(key, fn)
+    if key in cache["entries"]:
+        cache["hits"] += 1
+        return cache["entries"][key]
+    cache["misses"] += 1
+    result = await flight.do(key, fn)
+    cache["entries"][key] = result
+    return result
+
+
+async def web_search(query: str, max_results: int, timeout: Optional[float] = None) -> dict:
+    """Tavily search; identical concurrent queries share one request.
+
+    Degrades to an empty, `degraded` result when Tavily is failing, its
+    circuit is open or `timeout` runs out, so strategy generation continues
+    without live research.
+    """
+    key = ("tavily", normalize_key(query, max_results))
+    search = lambda: tavily.search(query=query, max_results=max_results, timeout=timeout)
+    try:
+        return await asyncio.wait_for(_cached(key, search_flight, search), timeout)
+    except (CircuitOpenError, httpx.HTTPError, asyncio.TimeoutError) as e:
+        logger.warning(f"Web search unavailable, continuing without research: {e!r}")
+        return {"results": [], "degraded": True}
+
+
+async def structured_llm(
+    schema: Type[T], prompt: str, node: str, tier: str = "large", interactive: bool = False,
+    timeout: Optional[float] = None,
+) -> T:
+    """Structured LLM call on the given tier; identical concurrent prompts share one generation.
+
+    Interactive calls (on the chat critical path) get a tighter deadline and are hedged.
+    `timeout` caps the gateway deadline (e.g. to what is left of the request).
+    Token usage is recorded against `node` for the current turn.
+    """
+    gateway = GATEWAYS[tier]
+    gateway_timeout = gateway.interactive_timeout_seconds if interactive else gateway.timeout_seconds
+
+    def on_usage(usage: dict) -> None:
+        record_usage(node, usage)
+        tier_stats.record_usage(tier, usage)
+
+    async def call():
+        start = time.monotonic()
+        result = await gateway.ainvoke_structured(
+            schema, prompt, interactive=interactive, timeout=cap(gateway_timeout, timeout), on_usage=on_usage
+        )
+        tier_stats.record(tier, time.monotonic() - start)
+        return result
+
+    key = (schema.__name__, tier, interactive, normalize_key(prompt))
+    return await _cached(key, llm_flight, call)
@@ -0,0 +1,101 @@
+"""
+Token usage accounting for LLM calls made while running the agent.
+
+Callers wrap one agent turn in `track_usage()`; every LLM call made inside it
+(including from graph nodes, which inherit the context) records its token
+usage against the node that made it.
+"""
+import contextvars
+import logging
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TURN_TOKEN_BUDGET = int(os.getenv("TURN_TOKEN_BUDGET", "20000"))
+
+
+def extract_usage(message) -> dict:
+    """Token counts from a LangChain AIMessage (zeros if the provider sent none)"""
+    metadata = getattr(message, "usage_metadata", None) or {}
+    return {
+        "input_tokens": int(metadata.get("input_tokens", 0)),
+        "output_tokens": int(metadata.get("output_tokens", 0)),
+    }
+
+
+class TurnUsage:
+    def __init__(self):
+        self.nodes = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+
+    def record(self, node: str, usage: dict) -> None:
+        entry = self.nodes[node]
+        entry["calls"] += 1
+        entry["input_tokens"] += usage.get("input_tokens", 0)
+        entry["output_tokens"] += usage.get("output_tokens", 0)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(n["input_tokens"] + n["output_tokens"] for n in self.nodes.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "nodes": dict(self.nodes),
+            "input_tokens": sum(n["input_tokens"] for n in self.nodes.values()),
+            "output_tokens": sum(n["output_tokens"] for n in self.nodes.values()),
+            "total_tokens": self.total_tokens,
+            "over_budget": self.total_tokens > TURN_TOKEN_BUDGET,
+        }
+
+
+class UsageTotals:
+    """Process-wide totals across turns, for the admin stats endpoint"""
+
+    def __init__(self):
+        self.turns = 0
+        self.over_budget_turns = 0
+        self.nodes = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+
+    def add(self, turn: TurnUsage) -> None:
+        self.turns += 1
+        for node, entry in turn.nodes.items():
+            for key, value in entry.items():
+                self.nodes[node][key] += value
+        if turn.total_tokens > TURN_TOKEN_BUDGET:
+            self.over_budget_turns += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "turns": self.turns,
+            "over_budget_turns": self.over_budget_turns,
+            "turn_token_budget": TURN_TOKEN_BUDGET,
+            "nodes": dict(self.nodes),
+        }
+
+
+usage_totals = UsageTotals()
+_current_turn: contextvars.ContextVar[Optional[TurnUsage]] = contextvars.ContextVar("turn_usage", default=None)
+
+
+def record_usage(node: str, usage: dict) -> None:
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.record(node, usage)
+
+
+@contextmanager
+def track_usage(label: str = ""):
+    turn = TurnUsage()
+    token = _current_turn.set(turn)
+    try:
+        yield turn
+    finally:
+        _current_turn.reset(token)
+        usage_totals.add(turn)
+        if turn.total_tokens > TURN_TOKEN_BUDGET:
+            logger.warning(
+                f"Turn {label} used {turn.total_tokens} tokens, over the {TURN_TOKEN_BUDGET} budget: "
+                f"{dict(turn.nodes)}"
+            )
@@ -1,4 +1,6 @@
+import asyncio
 import os
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -10,6 +12,9 @@ from supabase import create_client
 import hashlib
 import bcrypt
 
+from .components.revocation_cache import revocation_cache
+from .components.resilient_db import ResilientSupabase
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -17,7 +22,7 @@ import logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+supabase = ResilientSupabase(create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY")))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -26,9 +31,12 @@ REFRESH_SECRET_KEY = os.getenv("JWT_REFRESH_SECRET", "super-secret-refresh-chang
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15  # 15 minutes
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7 days
+REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS = int(os.getenv("REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS", "3600"))
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 class TokenData(BaseModel):
     user_id: str
+    expires_at: Optional[float] = None  # unix timestamp from the `exp` claim
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     hashed_password_bytes = hashed_password.encode('utf-8')
@@ -59,13 +67,13 @@ def get_password_hash(password: str) -> str:
     # bcrypt.hashpw returns bytes, decode to store as string
     return bcrypt.hashpw(password_hash.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
-    logger.debug(f"get_current_user called with token: {token[:20]}..." if token else "No token")
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def _decode_access_token(token: str) -> TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
@@ -73,12 +81,53 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
         if user_id is None:
             logger.error("user_id is None in token payload")
             raise credentials_exception
-        token_data = TokenData(user_id=user_id)
+        return TokenData(user_id=user_id, expires_at=payload.get("exp"))
     except JWTError as e:
         logger.error(f"JWTError: {e}")
         raise credentials_exception
-    
-    response = supabase.table("users").select("*").eq("id", token_data.user_id).execute()
+
+def verify_access_token(token: str) -> TokenData:
+    """Validate an access token outside of dependency injection (e.g. WebSocket auth frames)"""
+    return _decode_access_token(token)
+
+PROFILE_COLUMNS = "id, username, email, full_name"
+
+class UserVersion(BaseModel):
+    user_id: str
+    data_version: int  # bumped by database triggers on every chat/message write
+    profile: Optional[dict] = None  # PROFILE_COLUMNS, only from get_current_user_profile
+
+async def _load_user_version(token: str, columns: str) -> dict:
+    token_data = _decode_access_token(token)
+    response = await supabase.table("users").select(f"{columns}, data_version").eq("id", token_data.user_id).aexecute()
+    if not response.data:
+        logger.error(f"User not found for id: {token_data.user_id}")
+        raise credentials_exception
+    return response.data[0]
+
+async def get_current_user_version(token: str = Depends(oauth2_scheme)) -> UserVersion:
+    """Validate the access token and read only `id, data_version` of the user.
+
+    Used by hot read paths (e.g. conditional GETs): one primary-key lookup
+    rejects tokens of deleted users and gives the version chat_cache keys on.
+    """
+    row = await _load_user_version(token, "id")
+    return UserVersion(user_id=row["id"], data_version=row["data_version"])
+
+async def get_current_user_profile(token: str = Depends(oauth2_scheme)) -> UserVersion:
+    """get_current_user_version that also reads the profile columns in the same lookup"""
+    row = await _load_user_version(token, PROFILE_COLUMNS)
+    version = row.pop("data_version")
+    return UserVersion(user_id=row["id"], data_version=version, profile=row)
+
+async def get_current_user_id(current: UserVersion = Depends(get_current_user_version)) -> str:
+    return current.user_id
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    logger.debug(f"get_current_user called with token: {token[:20]}..." if token else "No token")
+    token_data = _decode_access_token(token)
+
+    response = await supabase.table("users").select("*").eq("id", token_data.user_id).aexecute()
     user = response.data[0] if response.data else None
     if user is None:
         logger.error(f"User not found for id: {token_data.user_id}")
@@ -86,6 +135,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     logger.debug(f"User authenticated: {user.get('username')}")
     return user
 
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Restrict operational endpoints to the usernames listed in ADMIN_USERNAMES"""
+    if current_user.get("username") not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -93,18 +148,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _hash_jti(jti: str) -> str:
+    return hashlib.sha256(jti.encode('utf-8')).hexdigest()
+
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    jti = uuid.uuid4().hex
+    to_encode.update({"exp": expire, "type": "refresh", "jti": jti})
     encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
     
-    # Store token in database
+    # Store only the hashed token id; lookups hit the unique index on token_hash
     user_id = data.get("sub")
     if user_id:
         try:
             supabase.table("refresh_tokens").insert({
-                "token": encoded_jwt,
+                "token_hash": _hash_jti(jti),
                 "user_id": user_id,
                 "expires_at": expire.isoformat()
             }).execute()
@@ -117,6 +176,13 @@ def create_refresh_token(data: dict):
             
     return encoded_jwt
 
+def _refresh_token_filter(payload: dict, token: str) -> tuple:
+    """Match refresh_tokens by hashed jti, falling back to the raw token for pre-jti tokens"""
+    jti = payload.get("jti")
+    if jti:
+        return "token_hash", _hash_jti(jti)
+    return "token", token
+
 def verify_refresh_token(token: str) -> Optional[str]:
     """Verify refresh token and return user_id if valid and not revoked"""
     try:
@@ -125,11 +191,17 @@ def verify_refresh_token(token: str) -> Optional[str]:
             return None
         user_id: str = payload.get("sub")
         
+        jti = payload.get("jti")
+        if jti and revocation_cache.is_revoked(_hash_jti(jti)):
+            logger.warning("Refresh token is revoked (cached)")
+            return None
+        
         # Check if token exists in DB and is not revoked
         try:
             response = supabase.table("refresh_tokens") \
                 .select("id, revoked") \
-                .eq("token", token) \
+                .eq(*_refresh_token_filter(payload, token)) \
+                .limit(1) \
                 .execute()
             
             if not response.data:
@@ -138,6 +210,8 @@ def verify_refresh_token(token: str) -> Optional[str]:
                 
             if response.data[0]["revoked"]:
                 logger.warning("Refresh token is revoked")
+                if jti:
+                    revocation_cache.add(_hash_jti(jti), payload["exp"])
                 return None
                 
         except Exception as e:
@@ -150,12 +224,40 @@ def verify_refresh_token(token: str) -> Optional[str]:
 
 def revoke_refresh_token(token: str) -> bool:
     """Revoke a refresh token"""
+    try:
+        payload = jwt.decode(token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        # Expired or forged tokens can't be used anyway
+        return False
+    
     try:
         supabase.table("refresh_tokens") \
             .update({"revoked": True}) \
-            .eq("token", token) \
+            .eq(*_refresh_token_filter(payload, token)) \
             .execute()
+        if payload.get("jti"):
+            revocation_cache.add(_hash_jti(payload["jti"]), payload["exp"])
         return True
     except Exception as e:
         logger.error(f"Failed to revoke token: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def sweep_expired_refresh_tokens() -> int:
+    """Delete refresh token rows past their expiry and compact the revocation cache"""
+    response = supabase.table("refresh_tokens") \
+        .delete() \
+        .lt("expires_at", datetime.utcnow().isoformat()) \
+        .execute()
+    revocation_cache.compact()
+    return len(response.data or [])
+
+async def refresh_token_sweeper():
+    """Background loop started from the app lifespan"""
+    while True:
+        try:
+            deleted = await asyncio.to_thread(sweep_expired_refresh_tokens)
+            if deleted:
+                logger.info(f"Swept {deleted} expired refresh tokens")
+        except Exception as e:
+            logger.error(f"Refresh token sweep failed: {e}")
+        await asyncio.sleep(REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS)
@@ -0,0 +1,235 @@
+"""
+Admission control for the LLM-heavy endpoints.
+
+Each limiter combines a token bucket (request rate) and a concurrency cap,
+both per user and globally. Requests that can't be admitted within a short,
+bounded wait are shed with 429 + Retry-After rather than piling up behind
+provider rate limits and dragging everyone's tail latency with them.
+
+Batch generation has its own limiter: a batch holds its slot for the whole
+stream, which would otherwise take one of the user's chat slots for minutes.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token, returning how long the caller must wait before it is really theirs"""
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class AdmissionRejected(HTTPException):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Server is busy ({reason}). Please retry shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class AdmissionLimiter:
+    def __init__(
+        self,
+        name: str,
+        user_rate_per_minute: float,
+        user_burst: int,
+        user_concurrency: int,
+        global_rate_per_minute: float,
+        global_burst: int,
+        global_concurrency: int,
+        max_wait_seconds: float,
+        max_queue: int,
+    ):
+        self.name = name
+        self.user_rate_per_minute = user_rate_per_minute
+        self.user_burst = user_burst
+        self.user_concurrency = user_concurrency
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queue = max_queue
+
+        self._global_bucket = TokenBucket(global_rate_per_minute, global_burst)
+        self._global_slots = asyncio.Semaphore(global_concurrency)
+        self._global_concurrency = global_concurrency
+        self._user_buckets: dict = {}
+        self._user_slots: dict = {}
+        self._user_pending = defaultdict(int)  # queued + in flight, per user
+        self.prune_threshold = 10_000
+
+        self.queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = defaultdict(int)
+        self.total_wait_seconds = 0.0
+
+    def _user_bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self._user_buckets[user_id] = TokenBucket(self.user_rate_per_minute, self.user_burst)
+        return bucket
+
+    def _user_semaphore(self, user_id: str) -> asyncio.Semaphore:
+        sem = self._user_slots.get(user_id)
+        if sem is None:
+            sem = self._user_slots[user_id] = asyncio.Semaphore(self.user_concurrency)
+        return sem
+
+    def _prune(self) -> None:
+        """Forget idle users whose bucket has fully refilled (their state is the default again)"""
+        for user_id in list(self._user_buckets):
+            if user_id in self._user_pending:
+                continue
+            bucket = self._user_buckets[user_id]
+            bucket._refill()
+            if bucket.tokens >= bucket.capacity:
+                del self._user_buckets[user_id]
+                self._user_slots.pop(user_id, None)
+
+    def _reject(self, reason: str, retry_after: float):
+        self.shed[reason] += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    async def _acquire(self, sem: asyncio.Semaphore, deadline: float, reason: str) -> None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 and sem.locked():
+            self._reject(reason, self.max_wait_seconds)
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=max(remaining, 0.001))
+        except asyncio.TimeoutError:
+            self._reject(reason, self.max_wait_seconds)
+
+    @asynccontextmanager
+    async def admit(self, user_id: str):
+        start = time.monotonic()
+        deadline = start + self.max_wait_seconds
+
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", self.max_wait_seconds)
+        if len(self._user_buckets) > self.prune_threshold:
+            self._prune()
+
+        # Rate: both buckets must be able to serve us within the wait budget
+        user_bucket = self._user_bucket(user_id)
+        user_wait = user_bucket.reserve()
+        if user_wait > self.max_wait_seconds:
+            user_bucket.refund()
+            self._reject("user_rate", user_wait)
+        global_wait = self._global_bucket.reserve()
+        if global_wait > self.max_wait_seconds:
+            user_bucket.refund()
+            self._global_bucket.refund()
+            self._reject("global_rate", global_wait)
+
+        self.queued += 1
+        self._user_pending[user_id] += 1
+        user_sem = self._user_semaphore(user_id)
+        holds_user_slot = False
+        admitted = False
+        try:
+            wait = max(user_wait, global_wait)
+            if wait:
+                await asyncio.sleep(wait)
+            await self._acquire(user_sem, deadline, "user_concurrency")
+            holds_user_slot = True
+            await self._acquire(self._global_slots, deadline, "global_concurrency")
+            admitted = True
+        finally:
+            self.queued -= 1
+            if not admitted:
+                # Shed (or cancelled) while waiting: the request never ran, so it costs no rate budget
+                if holds_user_slot:
+                    user_sem.release()
+                user_bucket.refund()
+                self._global_bucket.refund()
+                self._release_user(user_id)
+
+        self.admitted += 1
+        self.in_flight += 1
+        self.total_wait_seconds += time.monotonic() - start
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._global_slots.release()
+            user_sem.release()
+            self._release_user(user_id)
+
+    def _release_user(self, user_id: str) -> None:
+        self._user_pending[user_id] -= 1
+        if not self._user_pending[user_id]:
+            del self._user_pending[user_id]
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "active_users": len(self._user_pending),
+            "global_concurrency": self._global_concurrency,
+            "global_tokens": round(self._global_bucket.tokens, 2),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "avg_wait_seconds": round(self.total_wait_seconds / self.admitted, 4) if self.admitted else 0.0,
+        }
+
+
+def _limiter_from_env(name: str, prefix: str, **defaults) -> AdmissionLimiter:
+    def setting(key, cast):
+        return cast(os.getenv(f"{prefix}_{key.upper()}", defaults[key]))
+
+    return AdmissionLimiter(
+        name=name,
+        user_rate_per_minute=setting("user_rate_per_minute", float),
+        user_burst=setting("user_burst", int),
+        user_concurrency=setting("user_concurrency", int),
+        global_rate_per_minute=setting("global_rate_per_minute", float),
+        global_burst=setting("global_burst", int),
+        global_concurrency=setting("global_concurrency", int),
+        max_wait_seconds=setting("max_wait_seconds", float),
+        max_queue=setting("max_queue", int),
+    )
+
+
+chat_limiter = _limiter_from_env(
+    "chat", "CHAT_ADMISSION",
+    user_rate_per_minute=12, user_burst=4, user_concurrency=2,
+    global_rate_per_minute=600, global_burst=60, global_concurrency=32,
+    max_wait_seconds=5, max_queue=128,
+)
+
+batch_limiter = _limiter_from_env(
+    "batch", "BATCH_ADMISSION",
+    user_rate_per_minute=2, user_burst=2, user_concurrency=1,
+    global_rate_per_minute=60, global_burst=10, global_concurrency=4,
+    max_wait_seconds=5, max_queue=16,
+)
+
+upload_limiter = _limiter_from_env(
+    "upload", "UPLOAD_ADMISSION",
+    user_rate_per_minute=10, user_burst=5, user_concurrency=2,
+    global_rate_per_minute=300, global_burst=30, global_concurrency=8,
+    max_wait_seconds=5, max_queue=64,
+)
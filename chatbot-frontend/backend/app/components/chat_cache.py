@@ -0,0 +1,77 @@
+"""
+Per-user cached chat lists, message histories and ETags, keyed on the user's
+`data_version`.
+
+The version lives in the `users` row and database triggers bump it on every
+chat or message write (migrations/007), so a write handled by any worker
+invalidates every worker's cache and ETags agree across workers. Each request
+reads the version together with the auth check (get_current_user_version);
+cached payloads are stored with the version they were read at and are only
+served to requests that saw that same version.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+
+class ChatCache:
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call listener(user_id) after every local write (e.g. to push updates to open sockets)"""
+        self._listeners.append(listener)
+
+    def bump(self, user_id: str) -> None:
+        """Called after this worker changed the user's chats.
+
+        The database trigger already moved the version; this only frees the
+        now-unreachable entries early and notifies listeners.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+        for listener in self._listeners:
+            listener(user_id)
+
+    def etag(self, user_id: str, scope: str, version: int) -> str:
+        digest = hashlib.sha1(f"{user_id}:{scope}:{version}".encode("utf-8")).hexdigest()
+        return f'"{digest}"'
+
+    def get(self, user_id: str, scope: str, version: int) -> Optional[Any]:
+        key = (user_id, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, user_id: str, scope: str, version: int, data: Any) -> None:
+        """Store data read at `version`; never replaces an entry read at a newer version"""
+        key = (user_id, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > version:
+                return
+            self._entries[key] = (version, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 If-None-Match check (weak comparison, '*' matches anything)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+chat_cache = ChatCache()
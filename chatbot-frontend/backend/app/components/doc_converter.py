@@ -1,58 +1,77 @@
-import io
+import codecs
 import re
-from fastapi import UploadFile, HTTPException
+from typing import BinaryIO, Optional
+
 from pypdf import PdfReader
 
-async def process_document(file: UploadFile) -> str:
+TEXT_READ_BYTES = 1024 * 1024
+
+
+class DocumentError(ValueError):
+    """The document can't be turned into text; the message is shown to the user"""
+
+
+def is_supported(filename: str, content_type: Optional[str] = None) -> bool:
+    filename = (filename or "").lower()
+    return filename.endswith((".pdf", ".txt", ".md")) or content_type == "application/pdf"
+
+
+def extract_text(stream: BinaryIO, filename: str, content_type: Optional[str] = None) -> str:
     """
-    Accepts an uploaded file (PDF or Text), extracts content, 
-    and returns a clean string ready for an LLM.
+    Reads a stored document (PDF or Text) from a seekable binary stream,
+    extracts content, and returns a clean string ready for an LLM.
+    Blocking: run it in a worker thread.
     """
-    filename = file.filename.lower()
-    
+    filename = (filename or "").lower()
+
     # 1. Handle PDF Files
-    if filename.endswith(".pdf") or file.content_type == "application/pdf":
-        return await _extract_from_pdf(file)
-    
+    if filename.endswith(".pdf") or content_type == "application/pdf":
+        return _extract_from_pdf(stream)
+
     # 2. Handle Text/Markdown Files
     elif filename.endswith((".txt", ".md")):
-        content = await file.read()
-        return content.decode("utf-8")
-    
+        return _read_text(stream)
+
     else:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Unsupported file type: {filename}. Only PDF, TXT, and MD are supported."
-        )
+        raise DocumentError(f"Unsupported file type: {filename}. Only PDF, TXT, and MD are supported.")
+
+
+def _read_text(stream: BinaryIO) -> str:
+    # Decoded incrementally so a multi-byte character split across reads survives
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    while True:
+        block = stream.read(TEXT_READ_BYTES)
+        if not block:
+            break
+        try:
+            parts.append(decoder.decode(block))
+        except UnicodeDecodeError:
+            raise DocumentError("Text files must be UTF-8 encoded.")
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
 
-async def _extract_from_pdf(file: UploadFile) -> str:
+
+def _extract_from_pdf(stream: BinaryIO) -> str:
     try:
-        # Read file into memory
-        content = await file.read()
-        stream = io.BytesIO(content)
-        
-        # Parse PDF
+        # pypdf reads objects lazily from the stream instead of loading the whole file
         reader = PdfReader(stream)
         text_content = []
-        
+
         for page in reader.pages:
             text = page.extract_text()
             if text:
                 text_content.append(text)
-        
+
         full_text = "\n".join(text_content)
-        
-        # Check if PDF was image-based (empty text)
-        if not full_text.strip():
-             raise HTTPException(
-                status_code=400, 
-                detail="The PDF appears to be empty or contains only images (OCR required)."
-            )
-            
-        return _clean_text_for_llm(full_text)
-        
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+        raise DocumentError(f"Failed to process PDF: {str(e)}")
+
+    # Check if PDF was image-based (empty text)
+    if not full_text.strip():
+        raise DocumentError("The PDF appears to be empty or contains only images (OCR required).")
+
+    return _clean_text_for_llm(full_text)
 
 def _clean_text_for_llm(text: str) -> str:
     """
@@ -64,5 +83,5 @@ def _clean_text_for_llm(text: str) -> str:
     text = re.sub(r'\s+', ' ', text)
     # Remove null bytes or non-printable characters if necessary
     text = text.replace('\x00', '')
-    
-    return text.strip()
\ No newline at end of file
+
+    return text.strip()
@@ -0,0 +1,79 @@
+"""
+Background processing of stored documents off the request path.
+
+Each pool runs its jobs behind its own semaphore:
+- extraction: blocking functions (pypdf parsing, database writes) run in
+  worker threads, so a burst of uploads can't take every thread of the
+  default executor away from request handlers
+- summary: coroutines (map-reduce LLM summarization), kept separate so slow
+  LLM calls never hold up text extraction of the next upload
+
+The upload request returns as soon as the object is stored; clients poll
+GET /documents/{id} for status.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Set
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_JOB_CONCURRENCY = int(os.getenv("EXTRACTION_JOB_CONCURRENCY", "2"))
+SUMMARY_JOB_CONCURRENCY = int(os.getenv("SUMMARY_JOB_CONCURRENCY", "4"))
+
+
+class DocumentJobs:
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self.concurrency = concurrency
+        self.running = 0
+        self.counters = defaultdict(int)
+        self.total_seconds = 0.0
+        self.total_wait_seconds = 0.0
+
+    def submit(self, name: str, fn: Callable, *args) -> asyncio.Task:
+        """Schedule fn(*args): awaited if it's a coroutine function, else run in a worker thread.
+        The task is kept referenced until done."""
+        task = asyncio.create_task(self._run(name, fn, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.counters["submitted"] += 1
+        return task
+
+    async def _run(self, name: str, fn: Callable, *args) -> None:
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            started = time.monotonic()
+            self.total_wait_seconds += started - queued_at
+            self.running += 1
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await fn(*args)
+                else:
+                    await asyncio.to_thread(fn, *args)
+                self.counters["completed"] += 1
+            except Exception:
+                self.counters["failed"] += 1
+                logger.exception(f"Document {self.name} job {name} failed")
+            finally:
+                self.running -= 1
+                self.total_seconds += time.monotonic() - started
+
+    def snapshot(self) -> dict:
+        finished = self.counters["completed"] + self.counters["failed"]
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "pending": len(self._tasks) - self.running,
+            **self.counters,
+            "avg_seconds": round(self.total_seconds / finished, 3) if finished else 0.0,
+            "avg_wait_seconds": round(self.total_wait_seconds / finished, 3) if finished else 0.0,
+        }
+
+
+extraction_jobs = DocumentJobs("extraction", EXTRACTION_JOB_CONCURRENCY)
+summary_jobs = DocumentJobs("summary", SUMMARY_JOB_CONCURRENCY)
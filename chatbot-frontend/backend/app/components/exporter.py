@@ -0,0 +1,96 @@
+"""
+Streaming export of a user's chats and messages as NDJSON or a ZIP of markdown files.
+
+Everything is a generator that pages through the database and yields bytes
+as soon as they are ready, so memory stays flat regardless of account size.
+"""
+import json
+import re
+import zipfile
+from typing import Iterator
+
+EXPORT_PAGE_SIZE = 200
+
+EXPORT_MESSAGE_COLUMNS = "id, role, content, timestamp, strategy"
+
+
+def _paged(query_factory, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[dict]:
+    offset = 0
+    while True:
+        rows = query_factory().range(offset, offset + page_size - 1).execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+
+def iter_chats(supabase, user_id: str) -> Iterator[dict]:
+    return _paged(lambda: supabase.table("chat_sessions")
+                  .select("id, title, pinned, created_at, updated_at")
+                  .eq("user_id", user_id)
+                  .order("created_at")
+                  .order("id"))
+
+
+def iter_messages(supabase, chat_id: str) -> Iterator[dict]:
+    return _paged(lambda: supabase.table("chat_messages")
+                  .select(EXPORT_MESSAGE_COLUMNS)
+                  .eq("chat_session_id", chat_id)
+                  .order("timestamp")
+                  .order("id"))
+
+
+def stream_ndjson(supabase, user_id: str) -> Iterator[bytes]:
+    """One JSON object per line: each chat followed by its messages"""
+    for chat in iter_chats(supabase, user_id):
+        yield (json.dumps({"type": "chat", **chat}, default=str) + "\n").encode("utf-8")
+        for message in iter_messages(supabase, chat["id"]):
+            line = {"type": "message", "chat_id": chat["id"], **message}
+            yield (json.dumps(line, default=str) + "\n").encode("utf-8")
+
+
+class _ChunkBuffer:
+    """Write-only, unseekable sink for ZipFile that hands bytes back to the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+
+def _markdown_filename(chat: dict, used: set) -> str:
+    slug = re.sub(r"[^\w\-]+", "-", (chat.get("title") or "chat").strip().lower()).strip("-") or "chat"
+    name = f"{slug[:60]}-{str(chat['id'])[:8]}.md"
+    while name in used:
+        name = f"{slug[:60]}-{chat['id']}.md"
+    used.add(name)
+    return name
+
+
+def stream_markdown_zip(supabase, user_id: str) -> Iterator[bytes]:
+    """A ZIP with one markdown transcript per chat, written entry by entry"""
+    buffer = _ChunkBuffer()
+    used_names = set()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for chat in iter_chats(supabase, user_id):
+            with archive.open(_markdown_filename(chat, used_names), "w") as entry:
+                header = f"# {chat.get('title') or 'Chat'}\n\n_Created {chat.get('created_at')}_\n\n"
+                entry.write(header.encode("utf-8"))
+                for message in iter_messages(supabase, chat["id"]):
+                    speaker = "You" if message["role"] == "user" else "Assistant"
+                    block = f"---\n\n**{speaker}** ({message.get('timestamp')}):\n\n{message['content']}\n\n"
+                    entry.write(block.encode("utf-8"))
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    # Central directory is written on close
+    yield from buffer.drain()
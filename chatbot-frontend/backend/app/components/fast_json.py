@@ -0,0 +1,30 @@
+"""
+JSON responses serialized with orjson when it is installed (it ships with the
+LangChain stack), falling back to the standard library otherwise.
+
+Routes that return rows straight from the database (already trusted, already
+JSON-shaped) return FastJSONResponse directly, which also skips FastAPI's
+response_model validation pass; the response_model stays on the route for the
+OpenAPI schema.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(content: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,325 @@
+"""
+Opt-in profiling of live requests, written to PROFILING_DIR.
+
+A request is profiled when:
+- it carries `X-Profile: <PROFILING_TOKEN>` (disabled while the token is unset),
+  optionally with `X-Profile-Mode: cprofile | sampling`
+- an admin armed a rule for its path (POST /admin/profiling): the next N
+  matching requests are captured
+- it is picked by periodic sampling (PROFILING_SAMPLE_RATE)
+
+Two capture modes:
+- cprofile: deterministic, on the event loop thread for the duration of the
+  request. Saved as `.prof` (pstats; snakeviz, flameprof, gprof2dot) plus a
+  `.txt` of the top functions by cumulative time.
+- sampling: a background thread samples every thread's stack each
+  PROFILING_SAMPLE_INTERVAL_MS. Saved as `.folded` collapsed stacks, which
+  flamegraph.pl, inferno and speedscope render directly. It also sees worker
+  threads (pypdf extraction, sync Supabase calls) that cProfile would miss.
+
+Work a profiled request hands to a worker thread via profiled() (document
+extraction) is captured separately, on that thread only, under the same id.
+
+Captures on the event loop also see whatever other requests run at the same
+time, so only one runs at a time, and PROFILING_MAX_PER_MINUTE caps the
+overhead, including what sampling adds.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from typing import Callable, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_MAX_PER_MINUTE = int(os.getenv("PROFILING_MAX_PER_MINUTE", "6"))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+PROFILING_TOP_FUNCTIONS = 40
+
+PROFILE_MODES = ("cprofile", "sampling")
+PROFILING_ADMIN_PATH = "/admin/profiling"  # never profile the endpoints that manage profiling
+
+# Set for the duration of a profiled request; copied into tasks and to_thread() calls it spawns
+current_profile: contextvars.ContextVar[Optional["ProfileContext"]] = contextvars.ContextVar("current_profile", default=None)
+
+
+class ProfileContext:
+    def __init__(self, mode: str, label: str, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.label = label
+        self.trigger = trigger
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^\w\-]+", "-", text).strip("-")[:60] or "root"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class CProfileCapture:
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def save(self, base_path: str, header: str) -> List[str]:
+        self._profile.dump_stats(base_path + ".prof")
+        report = io.StringIO()
+        report.write(header + "\n\n")
+        pstats.Stats(self._profile, stream=report).sort_stats("cumulative").print_stats(PROFILING_TOP_FUNCTIONS)
+        with open(base_path + ".txt", "w") as f:
+            f.write(report.getvalue())
+        return [base_path + ".prof", base_path + ".txt"]
+
+
+class SamplingCapture:
+    """Samples stacks into collapsed "frame;frame;frame count" lines"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILING_SAMPLE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id  # None: every thread
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def save(self, base_path: str, header: str) -> List[str]:
+        with open(base_path + ".folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return [base_path + ".folded"]
+
+
+def _new_capture(mode: str, thread_id: Optional[int] = None):
+    return CProfileCapture() if mode == "cprofile" else SamplingCapture(thread_id=thread_id)
+
+
+class Profiler:
+    def __init__(self, directory: str = PROFILING_DIR):
+        self.directory = directory
+        self.sample_rate = PROFILING_SAMPLE_RATE
+        self.rules: Dict[str, dict] = {}  # path prefix -> {"mode", "remaining"}
+        self.captures = deque(maxlen=PROFILING_MAX_FILES)
+        self.counters = defaultdict(int)
+        self._window = deque()  # start times of captures in the last minute
+        self._active = False
+        self._lock = threading.Lock()
+
+    # --- selection ---
+
+    def arm(self, path_prefix: str, mode: str, count: int) -> dict:
+        with self._lock:
+            self.rules[path_prefix] = {"mode": mode, "remaining": count}
+        return self.rules[path_prefix]
+
+    def disarm(self, path_prefix: Optional[str] = None) -> None:
+        with self._lock:
+            if path_prefix is None:
+                self.rules.clear()
+            else:
+                self.rules.pop(path_prefix, None)
+
+    def _within_budget(self, now: float) -> bool:
+        while self._window and now - self._window[0] > 60:
+            self._window.popleft()
+        return len(self._window) < PROFILING_MAX_PER_MINUTE
+
+    def select(self, path: str, headers: Headers) -> Optional[ProfileContext]:
+        """Decide whether this request is profiled, and claim the single capture slot if so"""
+        if path.startswith(PROFILING_ADMIN_PATH):
+            return None
+        requested = headers.get("x-profile")
+        if requested and PROFILING_TOKEN and hmac.compare_digest(requested, PROFILING_TOKEN):
+            mode, trigger = headers.get("x-profile-mode", "cprofile"), "header"
+        else:
+            mode = trigger = None
+            for prefix, rule in self.rules.items():
+                if path.startswith(prefix) and rule["remaining"] > 0:
+                    mode, trigger = rule["mode"], f"rule:{prefix}"
+                    break
+            if trigger is None and self.sample_rate > 0 and random.random() < self.sample_rate:
+                mode, trigger = "sampling", "sampled"
+        if trigger is None or mode not in PROFILE_MODES:
+            return None
+
+        with self._lock:
+            now = time.monotonic()
+            if self._active or not self._within_budget(now):
+                self.counters["skipped_over_budget"] += 1
+                return None
+            if trigger.startswith("rule:"):
+                rule = self.rules.get(trigger[5:])
+                if rule is None or rule["remaining"] <= 0:
+                    return None
+                rule["remaining"] -= 1
+                if rule["remaining"] == 0:
+                    del self.rules[trigger[5:]]
+            self._active = True
+            self._window.append(now)
+        return ProfileContext(mode, path, trigger)
+
+    def release(self) -> None:
+        with self._lock:
+            self._active = False
+
+    # --- output ---
+
+    def save(self, context: ProfileContext, capture, name: str, seconds: float, details: str = "") -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        base_path = os.path.join(self.directory, f"{stamp}-{context.id}-{_slug(name)}")
+        header = f"{name} | {context.mode} | trigger={context.trigger} | {seconds * 1000:.1f} ms {details}".strip()
+        try:
+            files = capture.save(base_path, header)
+        except OSError as e:
+            logger.error(f"Could not write profile {base_path}: {e}")
+            return
+        if len(self.captures) == self.captures.maxlen:
+            for path in self.captures[0]["files"]:
+                try:
+                    os.remove(os.path.join(self.directory, path))
+                except FileNotFoundError:
+                    pass
+        self.captures.append({
+            "id": context.id,
+            "name": name,
+            "mode": context.mode,
+            "trigger": context.trigger,
+            "milliseconds": round(seconds * 1000, 1),
+            "files": [os.path.basename(path) for path in files],
+            "created_at": time.time(),
+        })
+        self.counters[f"captured_{context.mode}"] += 1
+        logger.info(f"Saved {context.mode} profile of {name} ({seconds * 1000:.1f} ms) to {base_path}")
+
+    def file_path(self, filename: str) -> Optional[str]:
+        for capture in self.captures:
+            if filename in capture["files"]:
+                return os.path.join(self.directory, filename)
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "directory": self.directory,
+            "header_enabled": bool(PROFILING_TOKEN),
+            "sample_rate": self.sample_rate,
+            "max_per_minute": PROFILING_MAX_PER_MINUTE,
+            "rules": dict(self.rules),
+            **self.counters,
+        }
+
+
+profiler = Profiler()
+
+
+def profiled(fn: Callable, label: str) -> Callable:
+    """Wrap a function handed to a worker thread so a profiled request's share of
+    background work is captured too (on that thread only, under the request's id)"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        context = current_profile.get()
+        if context is None:
+            return fn(*args, **kwargs)
+        capture = _new_capture(context.mode, thread_id=threading.get_ident())
+        start = time.monotonic()
+        try:
+            capture.start()
+        except ValueError:
+            # Another profiler owns this interpreter (cProfile is process-wide on 3.12+)
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            capture.stop()
+            profiler.save(context, capture, f"{context.label} {label}", time.monotonic() - start)
+    return wrapper
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profiler: Profiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        context = self.profiler.select(scope["path"], Headers(scope=scope))
+        if context is None:
+            await self.app(scope, receive, send)
+            return
+
+        context.label = f"{scope['method']} {scope['path']}"
+        status = {"code": None}
+
+        async def tagging_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = context.id
+            await send(message)
+
+        token = current_profile.set(context)
+        capture = _new_capture(context.mode)
+        start = time.monotonic()
+        capture.start()
+        try:
+            await self.app(scope, receive, tagging_send)
+        finally:
+            capture.stop()
+            seconds = time.monotonic() - start
+            current_profile.reset(token)
+            self.profiler.release()
+            # pstats formatting is not free; keep it off the event loop
+            await asyncio.to_thread(
+                self.profiler.save, context, capture, context.label, seconds, f"status={status['code']}"
+            )
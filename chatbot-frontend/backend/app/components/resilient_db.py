@@ -0,0 +1,81 @@
+"""
+Supabase client wrapper that runs every query's `.execute()` through the
+"supabase" circuit breaker.
+
+The client is synchronous: `.execute()` blocks, retry backoff included, so it
+is only for worker threads and scripts. Async code awaits `.aexecute()`, which
+runs each attempt in a worker thread and backs off with asyncio.sleep, so a
+failing Supabase never stalls the event loop.
+
+Only connect-phase errors are retried (the request never reached the server,
+so retrying is safe even for inserts); read timeouts and 5xx responses count
+against the breaker but are surfaced to the caller as-is.
+"""
+import asyncio
+import os
+
+import httpx
+from postgrest.exceptions import APIError
+
+from agent.resilience import RetryPolicy, breaker, call_async, call_sync
+
+
+def _is_failure(error: BaseException) -> bool:
+    if isinstance(error, APIError):
+        # PostgREST errors carry a PGRST/SQLSTATE code; gateway errors carry the HTTP status
+        return isinstance(error.code, int) and error.code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+SUPABASE_RETRY_POLICY = RetryPolicy(
+    is_failure=_is_failure,
+    is_retryable=_is_retryable,
+    max_retries=int(os.getenv("SUPABASE_MAX_RETRIES", "2")),
+)
+
+
+class _ResilientQuery:
+    """Proxies a query builder; chained builder calls stay wrapped until execute()"""
+
+    def __init__(self, builder, circuit):
+        self._builder = builder
+        self._circuit = circuit
+
+    def execute(self):
+        return call_sync(self._circuit, SUPABASE_RETRY_POLICY, self._builder.execute)
+
+    async def aexecute(self):
+        return await call_async(
+            self._circuit, SUPABASE_RETRY_POLICY, lambda: asyncio.to_thread(self._builder.execute)
+        )
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            # e.g. the `.not_` property returns the builder itself
+            return _ResilientQuery(attr, self._circuit) if hasattr(attr, "execute") else attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _ResilientQuery(result, self._circuit) if hasattr(result, "execute") else result
+
+        return chained
+
+
+class ResilientSupabase:
+    def __init__(self, client, name: str = "supabase"):
+        self._client = client
+        self.breaker = breaker(name)
+
+    def table(self, name: str) -> _ResilientQuery:
+        return _ResilientQuery(self._client.table(name), self.breaker)
+
+    def rpc(self, fn: str, params: dict) -> _ResilientQuery:
+        return _ResilientQuery(self._client.rpc(fn, params), self.breaker)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
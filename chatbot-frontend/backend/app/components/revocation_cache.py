@@ -0,0 +1,72 @@
+"""
+Bounded in-process mirror of revoked refresh tokens.
+
+A Bloom filter answers the common "never revoked" case without touching the
+LRU; a hit is confirmed against the exact LRU set so false positives only cost
+a dictionary lookup. Entries carry the token's own expiry, after which the JWT
+signature check rejects the token anyway and the entry can be dropped.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class BloomFilter:
+    def __init__(self, size_bits: int = 1 << 20, num_hashes: int = 5):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self._bits = bytearray(size_bits // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        for i in range(self.num_hashes):
+            chunk = int.from_bytes(digest[i * 4:(i + 1) * 4], "big")
+            yield chunk % self.size_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def clear(self) -> None:
+        self._bits = bytearray(self.size_bits // 8)
+
+
+class RevocationCache:
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._bloom = BloomFilter()
+        self._revoked: "OrderedDict[str, float]" = OrderedDict()  # token_hash -> exp timestamp
+        self._lock = threading.Lock()
+
+    def add(self, token_hash: str, expires_at: float) -> None:
+        with self._lock:
+            self._bloom.add(token_hash)
+            self._revoked[token_hash] = expires_at
+            self._revoked.move_to_end(token_hash)
+            while len(self._revoked) > self.max_entries:
+                self._revoked.popitem(last=False)
+
+    def is_revoked(self, token_hash: str) -> bool:
+        """True only if the revocation is known locally; False means "ask the database"."""
+        with self._lock:
+            if token_hash not in self._bloom:
+                return False
+            return token_hash in self._revoked
+
+    def compact(self) -> int:
+        """Drop expired entries and rebuild the Bloom filter from what is left."""
+        now = time.time()
+        with self._lock:
+            for token_hash in [h for h, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[token_hash]
+            self._bloom.clear()
+            for token_hash in self._revoked:
+                self._bloom.add(token_hash)
+            return len(self._revoked)
+
+
+revocation_cache = RevocationCache()
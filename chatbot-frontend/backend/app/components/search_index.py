@@ -0,0 +1,168 @@
+"""
+Full-text search over a user's chat messages and uploaded documents.
+
+Two interchangeable backends, picked with SEARCH_BACKEND:
+- postgres (default): tsvector columns + GIN indexes maintained by Postgres
+  itself (migrations/004_search_index.sql), queried through the
+  `search_user_content` RPC. Writes need no extra work.
+- sqlite: a local FTS5 table, for development and tests without Supabase.
+  Routes feed it incrementally as messages and documents are written.
+
+Both return the same rows: kind, id, chat_id, title, role, snippet (HTML
+escaped, matches wrapped in <mark>), score and created_at.
+"""
+import html
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "postgres")
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.db")
+SEARCH_KINDS = ("all", "message", "document")
+
+# Backends mark matches with these; they are swapped for <mark> after escaping
+_START, _STOP = "\x02", "\x03"
+
+
+def highlight(snippet: str) -> str:
+    return html.escape(snippet or "").replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+class SearchStats:
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.queries = 0
+        self.indexed = 0
+        self._latency_ms = deque(maxlen=500)
+
+    def record_query(self, seconds: float) -> None:
+        self.queries += 1
+        self._latency_ms.append(seconds * 1000)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self._latency_ms)
+        return {
+            "backend": self.backend,
+            "queries": self.queries,
+            "indexed": self.indexed,
+            "p50_ms": round(ordered[len(ordered) // 2], 2) if ordered else 0.0,
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2) if ordered else 0.0,
+        }
+
+
+class PostgresSearchIndex:
+    """Generated tsvector columns keep the index current, so the add/remove hooks are no-ops"""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self.stats = SearchStats("postgres")
+
+    def add_message(self, user_id: str, chat_id: str, message_id: str, role: str, content: str, title: str = "") -> None:
+        pass
+
+    def add_document(self, user_id: str, document_id: str, filename: str, content: str) -> None:
+        pass
+
+    def remove_chat(self, user_id: str, chat_id: str) -> None:
+        pass
+
+    def search(self, user_id: str, query: str, kind: str = "all", limit: int = 20, offset: int = 0) -> List[dict]:
+        start = time.monotonic()
+        rows = self.supabase.rpc("search_user_content", {
+            "p_user_id": user_id,
+            "p_query": query,
+            "p_kind": kind,
+            "p_limit": limit,
+            "p_offset": offset,
+            "p_start_sel": _START,
+            "p_stop_sel": _STOP,
+        }).execute().data
+        self.stats.record_query(time.monotonic() - start)
+        return [{**row, "snippet": highlight(row.get("snippet"))} for row in rows]
+
+
+class SQLiteSearchIndex:
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.stats = SearchStats("sqlite")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_entries USING fts5("
+            "content, title, kind UNINDEXED, ref_id UNINDEXED, chat_id UNINDEXED, "
+            "user_id UNINDEXED, role UNINDEXED, created_at UNINDEXED, "
+            "tokenize = 'porter unicode61')"
+        )
+        self._db.commit()
+
+    def _insert(self, **row) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO search_entries (content, title, kind, ref_id, chat_id, user_id, role, created_at) "
+                "VALUES (:content, :title, :kind, :ref_id, :chat_id, :user_id, :role, datetime('now'))",
+                row,
+            )
+            self._db.commit()
+        self.stats.indexed += 1
+
+    def add_message(self, user_id: str, chat_id: str, message_id: str, role: str, content: str, title: str = "") -> None:
+        self._insert(content=content or "", title=title or "", kind="message", ref_id=str(message_id),
+                     chat_id=str(chat_id), user_id=str(user_id), role=role)
+
+    def add_document(self, user_id: str, document_id: str, filename: str, content: str) -> None:
+        self._insert(content=content or "", title=filename or "", kind="document", ref_id=str(document_id),
+                     chat_id=None, user_id=str(user_id), role=None)
+
+    def remove_chat(self, user_id: str, chat_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM search_entries WHERE user_id = ? AND chat_id = ?", (str(user_id), str(chat_id)))
+            self._db.commit()
+
+    @staticmethod
+    def _match_expression(query: str) -> Optional[str]:
+        """Quote every term so user input can't inject FTS5 syntax; prefix-match the last one"""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return None
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def search(self, user_id: str, query: str, kind: str = "all", limit: int = 20, offset: int = 0) -> List[dict]:
+        expression = self._match_expression(query)
+        if expression is None:
+            return []
+        start = time.monotonic()
+        sql = (
+            "SELECT kind, ref_id, chat_id, title, role, "
+            f"snippet(search_entries, 0, '{_START}', '{_STOP}', '…', 16), "
+            "-bm25(search_entries, 1.0, 2.0), created_at "
+            "FROM search_entries WHERE search_entries MATCH ? AND user_id = ?"
+        )
+        params = [expression, str(user_id)]
+        if kind != "all":
+            sql += " AND kind = ?"
+            params.append(kind)
+        sql += " ORDER BY bm25(search_entries, 1.0, 2.0) LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        self.stats.record_query(time.monotonic() - start)
+        return [
+            {"kind": k, "id": ref_id, "chat_id": chat_id, "title": title, "role": role,
+             "snippet": highlight(snippet), "score": round(score, 4), "created_at": created_at}
+            for k, ref_id, chat_id, title, role, snippet, score, created_at in rows
+        ]
+
+
+def build_search_index(supabase):
+    if SEARCH_BACKEND == "sqlite":
+        logger.info(f"Using local SQLite FTS5 search index at {SEARCH_INDEX_PATH}")
+        return SQLiteSearchIndex(SEARCH_INDEX_PATH)
+    return PostgresSearchIndex(supabase)
@@ -0,0 +1,371 @@
+"""
+Document storage with chunked, resumable uploads.
+
+Two interchangeable backends, picked with STORAGE_BACKEND:
+- local (default): objects under STORAGE_LOCAL_ROOT, upload sessions staged
+  as `.uploads/<upload_id>.part` files that each chunk is appended to.
+- s3: any S3-compatible service (AWS, MinIO, R2, Supabase Storage's S3
+  endpoint) through boto3 multipart uploads, one part per chunk. Needs the
+  optional `boto3` package.
+
+Upload protocol, identical for both backends:
+1. begin() records the session (owner, key, declared size) and returns an id
+2. write_chunk() appends exactly UPLOAD_CHUNK_BYTES at the offset the session
+   has reached (only the last chunk may be shorter); a client that lost its
+   connection asks status() for `received` and continues from there
+3. complete() turns the staged bytes into the object at `key`
+
+Chunks are bounded, so memory per request stays constant whatever the file
+size. Session state lives in the backend itself (a JSON sidecar), so any
+worker sharing the storage can resume an upload another worker started.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import BinaryIO, Optional
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "storage")
+STORAGE_S3_BUCKET = os.getenv("STORAGE_S3_BUCKET", "")
+STORAGE_S3_ENDPOINT_URL = os.getenv("STORAGE_S3_ENDPOINT_URL") or None
+STORAGE_S3_REGION = os.getenv("STORAGE_S3_REGION") or None
+
+# S3 rejects multipart parts under 5 MiB (except the last one)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+
+SESSION_PREFIX = ".uploads"
+
+
+class UploadError(ValueError):
+    """The chunk or session is invalid; the message is safe to show to the client"""
+
+
+class UploadNotFound(UploadError):
+    pass
+
+
+class UploadOffsetMismatch(UploadError):
+    def __init__(self, received: int):
+        super().__init__(f"Chunk offset does not match; resume from byte {received}")
+        self.received = received
+
+
+def object_key(user_id: str, upload_id: str, filename: str) -> str:
+    safe_name = re.sub(r"[^\w.\-]+", "_", os.path.basename(filename or "")).strip("._") or "document"
+    return f"uploads/{user_id}/{upload_id}/{safe_name}"
+
+
+class StorageStats:
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.counters = defaultdict(int)
+
+    def snapshot(self) -> dict:
+        return {"backend": self.backend, "chunk_bytes": UPLOAD_CHUNK_BYTES, **self.counters}
+
+
+class StorageBackend(ABC):
+    name = "base"
+
+    def __init__(self, chunk_size: int = UPLOAD_CHUNK_BYTES, max_size: int = UPLOAD_MAX_BYTES):
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.stats = StorageStats(self.name)
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    # --- session bookkeeping shared by the backends ---
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks[upload_id]
+
+    def _forget_lock(self, upload_id: str) -> None:
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def begin(self, user_id: str, filename: str, content_type: Optional[str], size: int) -> dict:
+        if size < 0 or size > self.max_size:
+            raise UploadError(f"File size must be between 0 and {self.max_size} bytes")
+        upload_id = uuid.uuid4().hex
+        session = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "key": object_key(user_id, upload_id, filename),
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "created_at": time.time(),
+        }
+        self._start(session)
+        self.stats.counters["uploads_started"] += 1
+        return {**session, "received": 0, "chunk_size": self.chunk_size}
+
+    def status(self, upload_id: str) -> dict:
+        session = self._load_session(upload_id)
+        if time.time() - session["created_at"] > UPLOAD_SESSION_TTL_SECONDS:
+            self.abort(upload_id)
+            raise UploadNotFound("Upload session expired")
+        return {**session, "received": self._received(session), "chunk_size": self.chunk_size}
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> int:
+        """Append one chunk at `offset`; returns the bytes received so far"""
+        with self._lock(upload_id):
+            session = self.status(upload_id)
+            received, size = session["received"], session["size"]
+            if offset != received:
+                raise UploadOffsetMismatch(received)
+            end = offset + len(data)
+            if end > size:
+                raise UploadError("Chunk runs past the declared file size")
+            if len(data) != self.chunk_size and end != size:
+                raise UploadError(f"Only the last chunk may be shorter than {self.chunk_size} bytes")
+            if not data:
+                return received
+            self._append(session, offset, data)
+            self.stats.counters["chunks_written"] += 1
+            self.stats.counters["bytes_written"] += len(data)
+            return end
+
+    def complete(self, upload_id: str) -> dict:
+        with self._lock(upload_id):
+            session = self.status(upload_id)
+            if session["received"] != session["size"]:
+                raise UploadOffsetMismatch(session["received"])
+            self._finish(session)
+        self._forget_lock(upload_id)
+        self.stats.counters["uploads_completed"] += 1
+        return session
+
+    def abort(self, upload_id: str) -> None:
+        try:
+            session = self._load_session(upload_id)
+        except UploadNotFound:
+            return
+        self._discard(session)
+        self._forget_lock(upload_id)
+        self.stats.counters["uploads_aborted"] += 1
+
+    # --- backend specific ---
+
+    @abstractmethod
+    def _load_session(self, upload_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def _start(self, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    def _received(self, session: dict) -> int:
+        ...
+
+    @abstractmethod
+    def _append(self, session: dict, offset: int, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def _finish(self, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    def _discard(self, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Seekable binary stream of a stored object; the caller closes it"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+
+class LocalStorage(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_ROOT, **kwargs):
+        super().__init__(**kwargs)
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise UploadError("Invalid storage key")
+        return path
+
+    def _session_path(self, upload_id: str, suffix: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise UploadNotFound("Unknown upload")
+        return os.path.join(self.root, SESSION_PREFIX, f"{upload_id}{suffix}")
+
+    def _load_session(self, upload_id: str) -> dict:
+        try:
+            with open(self._session_path(upload_id, ".json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound("Unknown upload")
+
+    def _start(self, session: dict) -> None:
+        # Created on first upload rather than at import, so merely loading the app writes nothing
+        os.makedirs(os.path.join(self.root, SESSION_PREFIX), exist_ok=True)
+        open(self._session_path(session["upload_id"], ".part"), "wb").close()
+        with open(self._session_path(session["upload_id"], ".json"), "w") as f:
+            json.dump(session, f)
+
+    def _received(self, session: dict) -> int:
+        try:
+            return os.path.getsize(self._session_path(session["upload_id"], ".part"))
+        except FileNotFoundError:
+            raise UploadNotFound("Unknown upload")
+
+    def _append(self, session: dict, offset: int, data: bytes) -> None:
+        with open(self._session_path(session["upload_id"], ".part"), "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+
+    def _finish(self, session: dict) -> None:
+        target = self._path(session["key"])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self._session_path(session["upload_id"], ".part"), target)
+        os.remove(self._session_path(session["upload_id"], ".json"))
+
+    def _discard(self, session: dict) -> None:
+        for suffix in (".part", ".json"):
+            try:
+                os.remove(self._session_path(session["upload_id"], suffix))
+            except FileNotFoundError:
+                pass
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        try:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))  # the per-upload directory
+        except OSError:
+            pass
+
+
+class S3Storage(StorageBackend):
+    name = "s3"
+
+    def __init__(self, bucket: str = STORAGE_S3_BUCKET, client=None, **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            if not BOTO3_AVAILABLE:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires the `boto3` package")
+            client = boto3.client("s3", endpoint_url=STORAGE_S3_ENDPOINT_URL, region_name=STORAGE_S3_REGION)
+        self.bucket = bucket
+        self.client = client
+
+    def _session_key(self, upload_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise UploadNotFound("Unknown upload")
+        return f"{SESSION_PREFIX}/{upload_id}.json"
+
+    def _load_session(self, upload_id: str) -> dict:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self._session_key(upload_id))["Body"]
+            return json.loads(body.read())
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise UploadNotFound("Unknown upload")
+            raise
+
+    def _start(self, session: dict) -> None:
+        multipart = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=session["key"],
+            ContentType=session["content_type"] or "application/octet-stream",
+        )
+        session["s3_upload_id"] = multipart["UploadId"]
+        self.client.put_object(Bucket=self.bucket, Key=self._session_key(session["upload_id"]),
+                               Body=json.dumps(session).encode("utf-8"))
+
+    def _parts(self, session: dict) -> list:
+        parts, marker = [], 0
+        while True:
+            page = self.client.list_parts(Bucket=self.bucket, Key=session["key"],
+                                          UploadId=session["s3_upload_id"], PartNumberMarker=marker)
+            parts.extend(page.get("Parts", []))
+            if not page.get("IsTruncated"):
+                return parts
+            marker = page["NextPartNumberMarker"]
+
+    def _received(self, session: dict) -> int:
+        # The multipart upload itself is the source of truth after a crash
+        return sum(part["Size"] for part in self._parts(session))
+
+    def _append(self, session: dict, offset: int, data: bytes) -> None:
+        self.client.upload_part(Bucket=self.bucket, Key=session["key"], UploadId=session["s3_upload_id"],
+                                PartNumber=offset // self.chunk_size + 1, Body=data)
+
+    def _finish(self, session: dict) -> None:
+        parts = [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in self._parts(session)]
+        if parts:
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=session["key"],
+                                                  UploadId=session["s3_upload_id"],
+                                                  MultipartUpload={"Parts": parts})
+        else:
+            # Multipart uploads need at least one part; store empty files directly
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=session["key"],
+                                               UploadId=session["s3_upload_id"])
+            self.client.put_object(Bucket=self.bucket, Key=session["key"], Body=b"")
+        self.client.delete_object(Bucket=self.bucket, Key=self._session_key(session["upload_id"]))
+
+    def _discard(self, session: dict) -> None:
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=session["key"],
+                                               UploadId=session["s3_upload_id"])
+        except ClientError:
+            pass
+        self.client.delete_object(Bucket=self.bucket, Key=self._session_key(session["upload_id"]))
+
+    def open(self, key: str) -> BinaryIO:
+        # Spooled to a temp file: PDF parsing needs to seek, S3 bodies can't
+        spool = tempfile.TemporaryFile()
+        self.client.download_fileobj(self.bucket, key, spool)
+        spool.seek(0)
+        return spool
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+def copy_stream(storage: StorageBackend, upload_id: str, source: BinaryIO) -> int:
+    """Feed an already-spooled upload (multipart form file) through write_chunk"""
+    offset = 0
+    while True:
+        chunk = source.read(storage.chunk_size)
+        if not chunk:
+            return offset
+        offset = storage.write_chunk(upload_id, offset, chunk)
+
+
+def build_storage() -> StorageBackend:
+    if STORAGE_BACKEND == "s3":
+        logger.info(f"Using S3-compatible document storage (bucket {STORAGE_S3_BUCKET})")
+        return S3Storage()
+    logger.info(f"Using local document storage at {STORAGE_LOCAL_ROOT}")
+    return LocalStorage()
@@ -0,0 +1,165 @@
+"""
+WebSocket connections for the chat transport (`/ws`).
+
+Each connection owns a bounded outbound queue drained by a single writer
+task, so a slow client can never block the agent runs that produce frames:
+- progress frames are droppable and are discarded when the queue is full
+- result frames wait for room, and a client that stays full for
+  WS_SLOW_CONSUMER_SECONDS is disconnected (close code 1013)
+
+A heartbeat pings idle connections and closes ones that stop answering, and
+connections are indexed by user so chat-list changes can be pushed to every
+open tab of that user.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SLOW_CONSUMER_SECONDS = float(os.getenv("WS_SLOW_CONSUMER_SECONDS", "10"))
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+WS_MAX_TURNS_PER_CONNECTION = int(os.getenv("WS_MAX_TURNS_PER_CONNECTION", "4"))
+
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_INTERNAL_ERROR = 1011
+CLOSE_TOKEN_EXPIRED = 4001
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket, user_id: str, expires_at: Optional[float], hub: "ConnectionHub"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.hub = hub
+        self.turns: Dict[str, asyncio.Task] = {}  # request_id -> running agent turn
+        self.last_seen = time.monotonic()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self._writer: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                frame = await self._queue.get()
+                await self.websocket.send_text(json.dumps(frame, default=str))
+                self.hub.stats["frames_sent"] += 1
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        except Exception:
+            # Anything else (e.g. an unserializable frame) would leave frames piling up unsent
+            logger.exception(f"WebSocket writer failed for user {self.user_id}")
+            self.hub.stats["writer_errors"] += 1
+            await self.close(CLOSE_INTERNAL_ERROR, "Internal error")
+
+    async def _heartbeat_loop(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+            if self.expires_at is not None and time.time() >= self.expires_at:
+                await self.close(CLOSE_TOKEN_EXPIRED, "Access token expired; reconnect with a fresh token")
+                return
+            if time.monotonic() - self.last_seen > 2 * WS_HEARTBEAT_SECONDS:
+                self.hub.stats["heartbeat_timeouts"] += 1
+                await self.close(1001, "Heartbeat timeout")
+                return
+            self.push({"type": "ping", "ts": time.time()})
+
+    def push(self, frame: dict) -> bool:
+        """Queue a droppable frame (progress, pings, notifications); False if it was dropped"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.hub.stats["frames_dropped"] += 1
+            return False
+
+    async def send(self, frame: dict) -> None:
+        """Queue a frame that must arrive (results, errors), waiting out short backpressure"""
+        if self.closed:
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(frame), WS_SLOW_CONSUMER_SECONDS)
+        except asyncio.TimeoutError:
+            self.hub.stats["slow_consumer_closes"] += 1
+            await self.close(CLOSE_TRY_AGAIN_LATER, "Client is not reading fast enough")
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        if self.closed:
+            return
+        self.closed = True
+        # close() also runs inside a turn (slow consumer) or the heartbeat; never cancel the caller
+        current = asyncio.current_task()
+        try:
+            for task in self.turns.values():
+                if task is not current:
+                    task.cancel()
+            for task in (self._heartbeat, self._writer):
+                if task is not None and task is not current:
+                    task.cancel()
+            if self.websocket.client_state == WebSocketState.CONNECTED:
+                # Shielded, so cancelling the caller can't leave the socket open
+                await asyncio.shield(self._close_socket(code, reason))
+        finally:
+            self.hub.unregister(self)
+
+    async def _close_socket(self, code: int, reason: str) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except RuntimeError:
+            pass
+
+
+class ConnectionHub:
+    def __init__(self):
+        self._by_user: Dict[str, Set[Connection]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = defaultdict(int)
+
+    def register(self, connection: Connection) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._by_user[connection.user_id].add(connection)
+        self.stats["connections_opened"] += 1
+        self.stats["peak_connections"] = max(self.stats["peak_connections"], self.connection_count)
+
+    def unregister(self, connection: Connection) -> None:
+        connections = self._by_user.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._by_user[connection.user_id]
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self._by_user.values())
+
+    def notify_chats_changed(self, user_id: str) -> None:
+        """chat_cache listener; bumps can come from worker threads, so hop onto the loop"""
+        if self._loop is None or user_id not in self._by_user:
+            return
+        frame = {"type": "chats_changed"}
+        self._loop.call_soon_threadsafe(self._push_to_user, user_id, frame)
+
+    def _push_to_user(self, user_id: str, frame: dict) -> None:
+        for connection in list(self._by_user.get(user_id, ())):
+            connection.push(frame)
+
+    def snapshot(self) -> dict:
+        return {"open_connections": self.connection_count, "users": len(self._by_user), **self.stats}
+
+
+ws_hub = ConnectionHub()
@@ -1,9 +1,32 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+import math
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from agent.http_pool import http_pool
+from agent.resilience import CircuitOpenError
+from .auth import refresh_token_sweeper
+from .components.compression import CompressionMiddleware
+from .components.fast_json import FastJSONResponse
+from .components.profiling import ProfilingMiddleware
 from .routes import router
 
-app = FastAPI(title="Marketing Strategy Agent API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(refresh_token_sweeper())
+    yield
+    sweeper.cancel()
+    await http_pool.aclose()
+
+
+app = FastAPI(title="Marketing Strategy Agent API", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+app.add_middleware(CompressionMiddleware)
 
 # Allow frontend origin (adjust for production)
 app.add_middleware(
@@ -14,8 +37,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so a profile covers the whole request including the other middleware
+app.add_middleware(ProfilingMiddleware)
+
 app.include_router(router)
 
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # A dependency is marked down: fail fast with a retry hint instead of a 500
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"A backing service ({exc.name}) is temporarily unavailable. Please retry shortly."},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_in)))},
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Marketing Strategy Agent Backend"}
\ No newline at end of file
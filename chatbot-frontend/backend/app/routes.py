@@ -1,10 +1,18 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, WebSocket, WebSocketDisconnect, status
 from pydantic import BaseModel
 from typing import List, Optional
 
 from .auth import (
     get_current_user, 
+    get_current_user_id,
+    get_current_user_version,
+    get_current_user_profile,
+    UserVersion,
+    PROFILE_COLUMNS,
+    get_admin_user,
+    verify_access_token,
+    credentials_exception,
     create_access_token, 
     create_refresh_token,
     verify_refresh_token,
@@ -13,16 +21,58 @@ from .auth import (
     get_password_hash
 )
 from .agent_config import marketing_agent
-from .utils import format_strategy
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, StreamingResponse
+from .utils import format_strategy, summarize_strategy, render_cache, STRATEGY_RENDERERS
+from .components.chat_cache import chat_cache, etag_matches
+from .components.admission import batch_limiter, chat_limiter, upload_limiter
+from .components.exporter import stream_ndjson, stream_markdown_zip
+from .components.resilient_db import ResilientSupabase
+from .components.search_index import build_search_index, SEARCH_KINDS
+from .components.fast_json import FastJSONResponse
+from .components.compression import compression_stats
+from .components.ws_hub import ws_hub, Connection, WS_MAX_TURNS_PER_CONNECTION
+from .components.storage import build_storage, copy_stream, UploadError, UploadNotFound, UploadOffsetMismatch
+from .components.document_jobs import extraction_jobs, summary_jobs
+from .components.profiling import profiler, profiled, PROFILE_MODES
+from agent.singleflight import SingleFlight, normalize_key
+from agent.tools import search_flight, llm_flight
+from agent.config import llm_gateway, fast_gateway
+from agent.router import tier_stats
+from agent.http_pool import http_pool
+from agent.resilience import breakers_snapshot
+from agent.scheduler import llm_context, llm_scheduler
+from agent.speculation import speculator
+from agent.deadline import deadline_in, deadline_stats, REQUEST_DEADLINE_SECONDS
+from agent.usage import track_usage, usage_totals
+from agent.batch import run_batch
+from agent.summarizer import content_hash, summarize_text, summary_flight, summary_stats
+import asyncio
+import json
+import logging
+import time
+import uuid
 from supabase import create_client
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+supabase = ResilientSupabase(create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY")))
+search_index = build_search_index(supabase)
+storage = build_storage()
+chat_cache.add_listener(ws_hub.notify_chats_changed)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+message_flight = SingleFlight("send_message")
+
+BATCH_MAX_PRODUCTS = int(os.getenv("BATCH_MAX_PRODUCTS", "50"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Columns the chat view needs; structured strategy/analysis JSON is fetched on demand
+MESSAGE_COLUMNS = "id, chat_session_id, role, content, timestamp"
+
 # ------------------- Auth Models -------------------
 class SignupRequest(BaseModel):
     username: str
@@ -74,11 +124,34 @@ class UpdateChatRequest(BaseModel):
     title: Optional[str] = None
     pinned: Optional[bool] = None
 
+class BatchStrategyRequest(BaseModel):
+    products: List[str]  # one product description per item
+    concurrency: Optional[int] = None
+
+class ProfilingRuleRequest(BaseModel):
+    path_prefix: str  # e.g. "/chats/" or "/upload-doc"
+    mode: str = "cprofile"  # "cprofile" or "sampling"
+    count: int = 1  # how many matching requests to capture
+    sample_rate: Optional[float] = None  # also change periodic sampling (0 disables)
+
+# ------------------- Admission -------------------
+async def chat_admission(current_user: dict = Depends(get_current_user)):
+    async with chat_limiter.admit(current_user["id"]):
+        yield
+
+async def batch_admission(current_user: dict = Depends(get_current_user)):
+    async with batch_limiter.admit(current_user["id"]):
+        yield
+
+async def upload_admission(current_user: dict = Depends(get_current_user)):
+    async with upload_limiter.admit(current_user["id"]):
+        yield
+
 # ------------------- Auth Routes -------------------
 @router.post("/signup", response_model=TokenResponse)
 async def signup(request: SignupRequest):
     # Check if username or email exists
-    existing = supabase.table("users").select("id").or_(f"username.eq.{request.username},email.eq.{request.email}").execute()
+    existing = await supabase.table("users").select("id").or_(f"username.eq.{request.username},email.eq.{request.email}").aexecute()
     if existing.data:
         raise HTTPException(status_code=400, detail="Username or email already registered")
     
@@ -93,11 +166,11 @@ async def signup(request: SignupRequest):
     if request.full_name:
         user_data["full_name"] = request.full_name
     
-    response = supabase.table("users").insert(user_data).execute()
+    response = await supabase.table("users").insert(user_data).aexecute()
     
     user = response.data[0]
     access_token = create_access_token(data={"sub": str(user["id"])})  
-    refresh_token = create_refresh_token(data={"sub": str(user["id"])})
+    refresh_token = await asyncio.to_thread(create_refresh_token, {"sub": str(user["id"])})
     
     return {
         "access_token": access_token,
@@ -114,16 +187,16 @@ async def signup(request: SignupRequest):
 @router.post("/login", response_model=TokenResponse)
 async def login(request: LoginRequest):
     # Find user by username or email
-    response = supabase.table("users").select("*").or_(
+    response = await supabase.table("users").select("*").or_(
         f"username.eq.{request.identifier},email.eq.{request.identifier}"
-    ).execute()
+    ).aexecute()
     
     user = response.data[0] if response.data else None
     if not user or not verify_password(request.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Incorrect username/email or password")
     
     access_token = create_access_token(data={"sub": str(user["id"])})
-    refresh_token = create_refresh_token(data={"sub": str(user["id"])})
+    refresh_token = await asyncio.to_thread(create_refresh_token, {"sub": str(user["id"])})
     
     return {
         "access_token": access_token,
@@ -140,7 +213,7 @@ async def login(request: LoginRequest):
 @router.post("/refresh")
 async def refresh_token(request: RefreshRequest):
     """Exchange refresh token for a new access token"""
-    user_id = verify_refresh_token(request.refresh_token)
+    user_id = await asyncio.to_thread(verify_refresh_token, request.refresh_token)
     
     if not user_id:
         raise HTTPException(
@@ -149,7 +222,7 @@ async def refresh_token(request: RefreshRequest):
         )
     
     # Verify user still exists
-    response = supabase.table("users").select("*").eq("id", user_id).execute()
+    response = await supabase.table("users").select("*").eq("id", user_id).aexecute()
     user = response.data[0] if response.data else None
     
     if not user:
@@ -169,7 +242,7 @@ async def refresh_token(request: RefreshRequest):
 @router.post("/logout")
 async def logout(request: RefreshRequest):
     """Revoke the refresh token"""
-    revoke_refresh_token(request.refresh_token)
+    await asyncio.to_thread(revoke_refresh_token, request.refresh_token)
     return {"detail": "Successfully logged out"}
 
 @router.patch("/user/profile")
@@ -182,7 +255,7 @@ async def update_profile(request: ProfileUpdateRequest, current_user: dict = Dep
     
     if request.email is not None:
         # Check if email is already taken by another user
-        existing = supabase.table("users").select("id").eq("email", request.email).execute()
+        existing = await supabase.table("users").select("id").eq("email", request.email).aexecute()
         if existing.data and existing.data[0]["id"] != current_user["id"]:
             raise HTTPException(status_code=400, detail="Email already registered")
         update_data["email"] = request.email
@@ -191,7 +264,7 @@ async def update_profile(request: ProfileUpdateRequest, current_user: dict = Dep
         raise HTTPException(status_code=400, detail="No fields to update")
     
     # Update user profile
-    response = supabase.table("users").update(update_data).eq("id", current_user["id"]).execute()
+    response = await supabase.table("users").update(update_data).eq("id", current_user["id"]).aexecute()
     
     if not response.data:
         raise HTTPException(status_code=500, detail="Failed to update profile")
@@ -205,27 +278,50 @@ async def update_profile(request: ProfileUpdateRequest, current_user: dict = Dep
     }
 
 # ------------------- Chat Routes -------------------
+CHAT_COLUMNS = "id, title, pinned, created_at, updated_at"
+
+def _load_chats(user_id: str, version: int) -> list:
+    """Sidebar chat list, served from chat_cache while `version` is current"""
+    chats = chat_cache.get(user_id, "chats", version)
+    if chats is None:
+        result = supabase.table("chat_sessions") \
+            .select(CHAT_COLUMNS) \
+            .eq("user_id", user_id) \
+            .order("updated_at", desc=True) \
+            .execute()
+        chats = result.data
+        chat_cache.set(user_id, "chats", version, chats)
+    return chats
+
 @router.get("/chats", response_model=List[ChatSessionResponse])
-async def list_chats(current_user: dict = Depends(get_current_user)):
-    response = supabase.table("chat_sessions") \
-        .select("*") \
-        .eq("user_id", current_user["id"]) \
-        .order("updated_at", desc=True) \
-        .execute()
-    return response.data
+async def list_chats(
+    current: UserVersion = Depends(get_current_user_version),
+    if_none_match: Optional[str] = Header(None)
+):
+    # The version is read before the chats, so a concurrent write can't be masked
+    user_id, version = current.user_id, current.data_version
+    etag = chat_cache.etag(user_id, "chats", version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    
+    chats = await asyncio.to_thread(_load_chats, user_id, version)
+    
+    # Rows come straight from our own table: skip response_model validation
+    return FastJSONResponse(chats, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
 
 @router.post("/chats")
 async def create_chat(current_user: dict = Depends(get_current_user)):
-    response = supabase.table("chat_sessions").insert({
+    response = await supabase.table("chat_sessions").insert({
         "user_id": current_user["id"],
         "title": "New Chat"
-    }).execute()
+    }).aexecute()
+    chat_cache.bump(current_user["id"])
     return response.data[0]
 
 @router.patch("/chats/{chat_id}")
 async def update_chat(chat_id: str, request: UpdateChatRequest, current_user: dict = Depends(get_current_user)):
     # Verify ownership
-    ownership = supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).execute()
+    ownership = await supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).aexecute()
     if not ownership.data:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -237,36 +333,56 @@ async def update_chat(chat_id: str, request: UpdateChatRequest, current_user: di
     if update_data:
         update_data["updated_at"] = "now()"
     
-    response = supabase.table("chat_sessions").update(update_data).eq("id", chat_id).execute()
+    response = await supabase.table("chat_sessions").update(update_data).eq("id", chat_id).aexecute()
+    chat_cache.bump(current_user["id"])
     return response.data[0]
 
 @router.delete("/chats/{chat_id}")
 async def delete_chat(chat_id: str, current_user: dict = Depends(get_current_user)):
-    ownership = supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).execute()
+    ownership = await supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).aexecute()
     if not ownership.data:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    supabase.table("chat_sessions").delete().eq("id", chat_id).execute()
+    await supabase.table("chat_sessions").delete().eq("id", chat_id).aexecute()
+    search_index.remove_chat(current_user["id"], chat_id)
+    speculator.discard(chat_id)
+    chat_cache.bump(current_user["id"])
     return {"detail": "Chat deleted"}
 
 @router.get("/chats/{chat_id}/messages")
-async def get_messages(chat_id: str, current_user: dict = Depends(get_current_user)):
-    # Verify ownership
-    ownership = supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).execute()
-    if not ownership.data:
-        raise HTTPException(status_code=404, detail="Chat not found")
+async def get_messages(
+    chat_id: str,
+    current: UserVersion = Depends(get_current_user_version),
+    if_none_match: Optional[str] = Header(None)
+):
+    scope = f"messages:{chat_id}"
+    user_id, version = current.user_id, current.data_version
+    etag = chat_cache.etag(user_id, scope, version)
+    # Only tags we issued after an ownership check can match, so 304 is safe here
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
     
-    response = supabase.table("chat_messages") \
-        .select("*") \
-        .eq("chat_session_id", chat_id) \
-        .order("timestamp") \
-        .execute()
-    return response.data
+    messages = chat_cache.get(user_id, scope, version)
+    if messages is None:
+        # Verify ownership
+        ownership = await supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", user_id).aexecute()
+        if not ownership.data:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        
+        result = await supabase.table("chat_messages") \
+            .select(MESSAGE_COLUMNS) \
+            .eq("chat_session_id", chat_id) \
+            .order("timestamp") \
+            .aexecute()
+        messages = result.data
+        chat_cache.set(user_id, scope, version, messages)
+    
+    return FastJSONResponse(messages, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
 
-@router.post("/chats/{chat_id}/messages")
+@router.post("/chats/{chat_id}/messages", dependencies=[Depends(chat_admission)])
 async def send_message(chat_id: str, request: SendMessageRequest, current_user: dict = Depends(get_current_user)):
     # Verify ownership
-    ownership = supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).execute()
+    ownership = await supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).aexecute()
     if not ownership.data:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -274,32 +390,66 @@ async def send_message(chat_id: str, request: SendMessageRequest, current_user:
     if not user_message:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
+    # A double-submit of the same message joins the turn already in progress
+    # instead of storing a duplicate and running the agent twice
+    assistant_response = await message_flight.do(
+        (chat_id, normalize_key(user_message)),
+        lambda: _process_message(chat_id, current_user["id"], user_message)
+    )
+    
+    return {"detail": "Message processed", "assistant_response": assistant_response}
+
+async def _process_message(chat_id: str, user_id: str, user_message: str, on_progress=None) -> str:
+    """Store the user message, run one agent turn and store the reply.
+    
+    `on_progress(node, update)` (async) is awaited after each graph node when given.
+    """
     # Store user message
-    supabase.table("chat_messages").insert({
+    stored_user_message = await supabase.table("chat_messages").insert({
         "chat_session_id": chat_id,
         "role": "user",
         "content": user_message
-    }).execute()
+    }).aexecute()
+    search_index.add_message(user_id, chat_id, stored_user_message.data[0]["id"], "user", user_message)
+    chat_cache.bump(user_id)
     
     # Invoke agent (async) - fetch history first
-    history_response = supabase.table("chat_messages") \
-        .select("*") \
+    history_response = await supabase.table("chat_messages") \
+        .select("role, content, strategy") \
         .eq("chat_session_id", chat_id) \
         .order("timestamp") \
-        .execute()
+        .aexecute()
     
     # Format history for agent (exclude current user message which is already in request)
     # Actually, we should include all previous messages. The current one is passed as user_message.
+    # Earlier strategies go in as a compact summary of their fields, not the full markdown
     previous_messages = [
-        {"role": msg["role"], "content": msg["content"]} 
+        {"role": msg["role"], "content": summarize_strategy(msg["strategy"]) if msg.get("strategy") else msg["content"]} 
         for msg in history_response.data 
         if msg["content"] != user_message # simplified check, ideally use ID or just slice
     ]
     
-    result = await marketing_agent.ainvoke({
-        "messages": previous_messages,
-        "user_message": user_message
-    })
+    with track_usage(label=f"chat {chat_id}") as usage, llm_context(user_id=user_id):
+        state = {
+            "messages": previous_messages,
+            "user_message": user_message,
+            "deadline": deadline_in(REQUEST_DEADLINE_SECONDS),
+            "session_id": chat_id,
+        }
+        try:
+            if on_progress is None:
+                result = await marketing_agent.ainvoke(state)
+            else:
+                result = dict(state)
+                async for update in marketing_agent.astream(state, stream_mode="updates"):
+                    for node, values in update.items():
+                        result.update(values or {})
+                        await on_progress(node, values or {})
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Generating a response took too long. Please try again."
+            )
     
     # Check if we have a strategy or just a conversation response
     if result.get("strategy"):
@@ -311,84 +461,627 @@ async def send_message(chat_id: str, request: SendMessageRequest, current_user:
         # Fallback
         assistant_response = "I'm listening. Please tell me more."
     
-    # Store assistant message
-    supabase.table("chat_messages").insert({
+    # Store assistant message, keeping the structured objects for later reuse
+    stored_reply = await supabase.table("chat_messages").insert({
         "chat_session_id": chat_id,
         "role": "assistant",
-        "content": assistant_response
-    }).execute()
+        "content": assistant_response,
+        "usage": usage.to_dict(),
+        "strategy": result["strategy"].model_dump(mode="json") if result.get("strategy") else None,
+        "analysis": result["analysis"].model_dump(mode="json") if result.get("analysis") else None
+    }).aexecute()
+    search_index.add_message(user_id, chat_id, stored_reply.data[0]["id"], "assistant", assistant_response)
     
     # Update chat session timestamp
-    supabase.table("chat_sessions").update({"updated_at": "now()"}).eq("id", chat_id).execute()
+    await supabase.table("chat_sessions").update({"updated_at": "now()"}).eq("id", chat_id).aexecute()
+    chat_cache.bump(user_id)
     
-    return {"detail": "Message processed", "assistant_response": assistant_response}
-
+    return assistant_response
 
+@router.get("/chats/{chat_id}/messages/{message_id}/strategy")
+async def get_strategy(chat_id: str, message_id: str, format: str = "json", current_user: dict = Depends(get_current_user)):
+    """Structured strategy/analysis for an assistant message, or the strategy rendered as markdown, html or text"""
+    if format != "json" and format not in STRATEGY_RENDERERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    
+    ownership = await supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", current_user["id"]).aexecute()
+    if not ownership.data:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    response = await supabase.table("chat_messages") \
+        .select("id, strategy, analysis") \
+        .eq("id", message_id) \
+        .eq("chat_session_id", chat_id) \
+        .aexecute()
+    if not response.data or not response.data[0].get("strategy"):
+        raise HTTPException(status_code=404, detail="No strategy stored for this message")
+    
+    message = response.data[0]
+    if format == "json":
+        return {"strategy": message["strategy"], "analysis": message.get("analysis")}
+    
+    rendered = render_cache.render(message_id, format, message["strategy"])
+    if format == "html":
+        return HTMLResponse(rendered)
+    return PlainTextResponse(rendered, media_type="text/markdown" if format == "markdown" else "text/plain")
 
+# ------------------- Bootstrap -------------------
+BOOTSTRAP_PAGE_SIZE = 50
+BOOTSTRAP_MAX_PAGE_SIZE = 200
+# Listing columns only: `content` holds the full extracted text
+DOCUMENT_COLUMNS = "id, filename, file_path, content_type, file_size, content_summary, summary_status, status, error, character_count, created_at"
 
+def _load_profile(user_id: str) -> Optional[dict]:
+    response = supabase.table("users").select(PROFILE_COLUMNS).eq("id", user_id).execute()
+    return response.data[0] if response.data else None
 
-from fastapi import File, UploadFile
-# Import the function we just created
-from app.components.doc_converter import process_document 
+def _load_documents(user_id: str, limit: int) -> list:
+    try:
+        return supabase.table("documents") \
+            .select(DOCUMENT_COLUMNS) \
+            .eq("user_id", user_id) \
+            .order("created_at", desc=True) \
+            .limit(limit) \
+            .execute().data
+    except Exception:
+        # Same fallback as /documents: a missing table shouldn't block page load
+        logger.exception("Error listing documents")
+        return []
 
-@router.post("/upload-doc")
-async def upload_document(
-    file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+@router.get("/bootstrap")
+async def bootstrap(
+    chat_limit: int = BOOTSTRAP_PAGE_SIZE,
+    document_limit: int = BOOTSTRAP_PAGE_SIZE,
+    current: UserVersion = Depends(get_current_user_profile)
 ):
-    # 1. Extract text (simulated or real)
-    clean_text = await process_document(file)
+    """Profile, first page of chats and first page of documents in one round trip.
     
-    file_path = f"uploads/{current_user['id']}/{file.filename}"
+    The token is verified once, reading the profile along with the data
+    version; the chat and document reads then run concurrently.
+    """
+    chat_limit = max(1, min(chat_limit, BOOTSTRAP_MAX_PAGE_SIZE))
+    document_limit = max(1, min(document_limit, BOOTSTRAP_MAX_PAGE_SIZE))
+    user_id, version = current.user_id, current.data_version
     
+    chats, documents = await asyncio.gather(
+        asyncio.to_thread(_load_chats, user_id, version),
+        asyncio.to_thread(_load_documents, user_id, document_limit + 1),
+    )
+    
+    return FastJSONResponse({
+        "user": UserInfo(**current.profile).model_dump(),
+        "chats": chats[:chat_limit],
+        "has_more_chats": len(chats) > chat_limit,
+        "documents": documents[:document_limit],
+        "has_more_documents": len(documents) > document_limit
+    })
+
+# ------------------- WebSocket -------------------
+WS_AUTH_TIMEOUT_SECONDS = 10
+WS_DELTA_CHARS = 400
+CLOSE_POLICY_VIOLATION = 1008
+
+def _progress_summary(node: str, values: dict) -> dict:
+    """Small, UI-friendly view of what a graph node just produced"""
+    if node == "conversation":
+        generating = values.get("intent") == "GENERATE_STRATEGY"
+        return {"next": "analysis" if generating else None}
+    if node == "analysis" and values.get("analysis") is not None:
+        analysis = values["analysis"]
+        return {
+            "next": "strategy",
+            "product_summary": analysis.product_summary,
+            "competitors": [competitor.name for competitor in analysis.competitors],
+        }
+    return {"next": None}
+
+async def _ws_authenticate(frame: dict):
+    if frame.get("type") != "auth" or not isinstance(frame.get("token"), str):
+        raise credentials_exception
+    token_data = verify_access_token(frame["token"])
+    profile = await asyncio.to_thread(_load_profile, token_data.user_id)
+    if profile is None:
+        raise credentials_exception
+    return token_data, profile
+
+async def _ws_turn(connection: Connection, request_id: str, chat_id: str, content: str):
+    user_id = connection.user_id
+    tag = {"request_id": request_id, "chat_id": chat_id}
     try:
-        # Save metadata to database
-        response = supabase.table("documents").insert({
-            "user_id": current_user["id"],
-            "filename": file.filename,
-            "file_path": file_path,
-            "content_type": file.content_type,
-            "file_size": file.size or 0,
-            "content_summary": clean_text[:200] + "..." if clean_text else None
-        }).execute()
+        ownership = await asyncio.to_thread(
+            lambda: supabase.table("chat_sessions").select("id").eq("id", chat_id).eq("user_id", user_id).execute()
+        )
+        if not ownership.data:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        user_message = (content or "").strip()
+        if not user_message:
+            raise HTTPException(status_code=400, detail="Message cannot be empty")
         
-        doc_id = response.data[0]["id"]
+        async def on_progress(node: str, values: dict):
+            connection.push({"type": "progress", **tag, "node": node, **_progress_summary(node, values)})
         
-        return {
-            "filename": file.filename,
-            "file_path": file_path,
-            "document_id": doc_id,
-            "summary": clean_text[:100] if clean_text else None,
-            "character_count": len(clean_text) if clean_text else 0
-        }
+        async with chat_limiter.admit(user_id):
+            # Same coalescing as the HTTP route; only the leading caller sees node progress
+            reply = await message_flight.do(
+                (chat_id, normalize_key(user_message)),
+                lambda: _process_message(chat_id, user_id, user_message, on_progress)
+            )
+        # Agent output is structured, so the text exists only once the turn is done; deliver it incrementally
+        for start in range(0, len(reply), WS_DELTA_CHARS):
+            await connection.send({"type": "delta", **tag, "content": reply[start:start + WS_DELTA_CHARS]})
+        await connection.send({"type": "done", **tag})
+    except HTTPException as e:
+        await connection.send({
+            "type": "error", **tag, "status": e.status_code, "detail": e.detail,
+            "retry_after": (e.headers or {}).get("Retry-After")
+        })
+    except asyncio.CancelledError:
+        # Stored messages are unaffected: the shielded turn finishes in the background
+        connection.push({"type": "cancelled", **tag})
+        raise
     except Exception as e:
-        # If table doesn't exist yet, fallback to simple return
-        print(f"DB Error: {e}")
-        return {
-             "filename": file.filename,
-             "summary": clean_text[:100] if clean_text else "Uploaded",
-             "character_count": len(clean_text) if clean_text else 0
-        }
+        logger.exception(f"WebSocket turn {request_id} failed")
+        await connection.send({"type": "error", **tag, "status": 500, "detail": "Failed to process message"})
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    """Chat over one authenticated connection.
+    
+    Client frames: auth {token} (first, and again to extend past token expiry),
+    send {request_id, chat_id, content}, cancel {request_id}, ping/pong.
+    Server frames: ready, progress, delta, done, error, cancelled,
+    chats_changed, ping/pong. Turns on different chats run concurrently.
+    """
+    await websocket.accept()
+    try:
+        frame = json.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT_SECONDS))
+        token_data, profile = await _ws_authenticate(frame)
+    except (asyncio.TimeoutError, HTTPException, ValueError, TypeError, AttributeError):
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="Authentication required")
+        return
+    except WebSocketDisconnect:
+        return
+    
+    connection = Connection(websocket, token_data.user_id, token_data.expires_at, ws_hub)
+    ws_hub.register(connection)
+    connection.start()
+    await connection.send({"type": "ready", "user": UserInfo(**profile).model_dump()})
+    try:
+        while not connection.closed:
+            raw = await websocket.receive_text()
+            connection.last_seen = time.monotonic()
+            try:
+                frame = json.loads(raw)
+                kind = frame.get("type")
+            except (ValueError, AttributeError):
+                connection.push({"type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+                continue
+            
+            if kind == "ping":
+                connection.push({"type": "pong", "ts": frame.get("ts")})
+            elif kind == "pong":
+                pass
+            elif kind == "auth":
+                try:
+                    token_data, _ = await _ws_authenticate(frame)
+                except HTTPException:
+                    token_data = None
+                if token_data is None or token_data.user_id != connection.user_id:
+                    await connection.close(CLOSE_POLICY_VIOLATION, "Invalid token")
+                    break
+                connection.expires_at = token_data.expires_at
+                connection.push({"type": "ready", "user": {"id": connection.user_id}})
+            elif kind == "send":
+                request_id = str(frame.get("request_id") or uuid.uuid4())
+                if len(connection.turns) >= WS_MAX_TURNS_PER_CONNECTION or request_id in connection.turns:
+                    connection.push({"type": "error", "request_id": request_id, "status": 429,
+                                     "detail": "Too many turns in flight on this connection"})
+                    continue
+                task = asyncio.create_task(
+                    _ws_turn(connection, request_id, str(frame.get("chat_id")), frame.get("content"))
+                )
+                connection.turns[request_id] = task
+                task.add_done_callback(lambda _, rid=request_id: connection.turns.pop(rid, None))
+            elif kind == "cancel":
+                task = connection.turns.get(str(frame.get("request_id")))
+                if task is not None:
+                    task.cancel()
+            else:
+                connection.push({"type": "error", "status": 400, "detail": f"Unknown frame type: {kind}"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await connection.close()
+
+# ------------------- Search -------------------
+SEARCH_MAX_LIMIT = 50
+
+@router.get("/search")
+async def search(
+    q: str,
+    kind: str = "all",
+    limit: int = 20,
+    offset: int = 0,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Ranked full-text search over the user's messages and documents, with highlighted snippets"""
+    if kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported kind: {kind}")
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    
+    # One extra row tells us whether there is a next page without a count query
+    rows = await asyncio.to_thread(search_index.search, user_id, q, kind, limit + 1, offset)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # The local index doesn't track chat titles (they can be renamed); fill them for this page
+    untitled = {row["chat_id"] for row in rows if row["kind"] == "message" and not row.get("title")}
+    if untitled:
+        titles = await supabase.table("chat_sessions").select("id, title").in_("id", list(untitled)).aexecute()
+        by_id = {str(chat["id"]): chat["title"] for chat in titles.data}
+        for row in rows:
+            if row["kind"] == "message" and not row.get("title"):
+                row["title"] = by_id.get(str(row["chat_id"]))
+    
+    return FastJSONResponse({
+        "query": q,
+        "results": rows,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if has_more else None
+    })
+
+# ------------------- Batch Routes -------------------
+@router.post("/strategies/batch", dependencies=[Depends(batch_admission)])
+async def batch_strategies(request: BatchStrategyRequest, current_user: dict = Depends(get_current_user)):
+    """Generate 90-day strategies for many products, streaming NDJSON results as each finishes"""
+    products = [p.strip() for p in request.products if p.strip()]
+    if not products:
+        raise HTTPException(status_code=400, detail="No products given")
+    if len(products) > BATCH_MAX_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_PRODUCTS} products per batch")
+    concurrency = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    
+    async def stream():
+        async for item in run_batch(products, concurrency, user_id=current_user["id"]):
+            yield json.dumps(item) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# ------------------- Export -------------------
+@router.get("/export")
+async def export_chats(format: str = "ndjson", current_user: dict = Depends(get_current_user)):
+    """Stream every chat and message of the user as NDJSON or a ZIP of markdown transcripts"""
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(supabase, current_user["id"]),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="chats-{stamp}.ndjson"'}
+        )
+    if format == "zip":
+        return StreamingResponse(
+            stream_markdown_zip(supabase, current_user["id"]),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="chats-{stamp}.zip"'}
+        )
+    raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+
+
+# ------------------- Documents -------------------
+from fastapi import File, Request, UploadFile
+from app.components.doc_converter import DocumentError, extract_text, is_supported
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+
+def _upload_session(upload_id: str, user_id: str) -> dict:
+    try:
+        session = storage.status(upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if session["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+def _upload_progress(session: dict) -> dict:
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "received": session["received"],
+        "chunk_size": session["chunk_size"],
+    }
+
+def _extract_document(document_id: str, user_id: str, key: str, filename: str, content_type: Optional[str]) -> Optional[str]:
+    """Read the stored object, extract its text and mark the document ready; None if it can't be read"""
+    try:
+        with storage.open(key) as stream:
+            clean_text = extract_text(stream, filename, content_type)
+    except Exception as e:
+        error = str(e) if isinstance(e, DocumentError) else "Failed to process document"
+        supabase.table("documents").update({"status": "failed", "error": error}).eq("id", document_id).execute()
+        if isinstance(e, DocumentError):
+            return None
+        raise
+    supabase.table("documents").update({
+        "status": "ready",
+        # Placeholder until the background summary replaces it
+        "content_summary": clean_text[:200] + "..." if clean_text else None,
+        "content": clean_text,
+        "character_count": len(clean_text),
+        "content_hash": content_hash(clean_text),
+        "summary_status": "pending" if clean_text.strip() else "none",
+    }).eq("id", document_id).execute()
+    search_index.add_document(user_id, document_id, filename, clean_text)
+    return clean_text
+
+async def _process_document(document_id: str, user_id: str, key: str, filename: str, content_type: Optional[str]) -> None:
+    """Background job: text extraction, then summarization on its own job pool"""
+    clean_text = await asyncio.to_thread(
+        profiled(_extract_document, "extract"), document_id, user_id, key, filename, content_type
+    )
+    if clean_text and clean_text.strip():
+        summary_jobs.submit(f"summarize:{document_id}", _summarize_document, document_id, user_id, clean_text)
+
+def _cached_summary(digest: str) -> Optional[str]:
+    response = supabase.table("document_summaries").select("summary").eq("content_hash", digest).execute()
+    return response.data[0]["summary"] if response.data else None
+
+async def _summarize_document(document_id: str, user_id: str, clean_text: str) -> None:
+    """Map-reduce summary of the extracted text, shared by every document with the same content"""
+    digest = content_hash(clean_text)
+    try:
+        summary = await asyncio.to_thread(_cached_summary, digest)
+        if summary is not None:
+            summary_stats.counters["cache_hits"] += 1
+        else:
+            summary_stats.counters["cache_misses"] += 1
+            # Identical documents uploaded at the same time share one summarization
+            with llm_context(user_id=user_id, priority="batch"):
+                summary = await summary_flight.do(digest, lambda: summarize_text(clean_text))
+            await asyncio.to_thread(supabase.table("document_summaries").upsert({
+                "content_hash": digest,
+                "summary": summary,
+            }).execute)
+    except Exception:
+        summary_stats.counters["failed"] += 1
+        await asyncio.to_thread(
+            supabase.table("documents").update({"summary_status": "failed"}).eq("id", document_id).execute
+        )
+        raise
+    await asyncio.to_thread(
+        supabase.table("documents").update({"content_summary": summary, "summary_status": "ready"}).eq("id", document_id).execute
+    )
+
+async def _register_document(session: dict) -> dict:
+    """Insert the document row for a completed upload and queue its extraction"""
+    response = await asyncio.to_thread(supabase.table("documents").insert({
+        "user_id": session["user_id"],
+        "filename": session["filename"],
+        "file_path": session["key"],
+        "content_type": session["content_type"],
+        "file_size": session["size"],
+        "status": "processing",
+    }).execute)
+    document = response.data[0]
+    extraction_jobs.submit(
+        f"process:{document['id']}", _process_document,
+        document["id"], session["user_id"], session["key"], session["filename"], session["content_type"],
+    )
+    return {
+        "document_id": document["id"],
+        "filename": session["filename"],
+        "file_path": session["key"],
+        "file_size": session["size"],
+        "status": "processing",
+    }
+
+@router.post("/uploads", dependencies=[Depends(upload_admission)])
+async def create_upload(request: UploadInitRequest, current_user: dict = Depends(get_current_user)):
+    """Start a resumable upload; the client then PUTs `chunk_size` byte chunks in order"""
+    if not is_supported(request.filename, request.content_type):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {request.filename}. Only PDF, TXT, and MD are supported.")
+    try:
+        session = await asyncio.to_thread(
+            storage.begin, current_user["id"], request.filename, request.content_type, request.size
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return _upload_progress(session)
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Bytes received so far, to resume an interrupted upload"""
+    session = await asyncio.to_thread(_upload_session, upload_id, current_user["id"])
+    return _upload_progress(session)
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request, current_user: dict = Depends(get_current_user)):
+    """Append one chunk (raw request body) at `offset`"""
+    session = await asyncio.to_thread(_upload_session, upload_id, current_user["id"])
+    # Read the body up to one chunk; anything larger is rejected without buffering it
+    chunk = bytearray()
+    async for part in request.stream():
+        chunk.extend(part)
+        if len(chunk) > session["chunk_size"]:
+            raise HTTPException(status_code=413, detail=f"Chunks are limited to {session['chunk_size']} bytes")
+    try:
+        received = await asyncio.to_thread(storage.write_chunk, upload_id, offset, bytes(chunk))
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.received)})
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"upload_id": upload_id, "received": received, "size": session["size"]}
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Finish the upload and queue text extraction; poll GET /documents/{id} for the result"""
+    await asyncio.to_thread(_upload_session, upload_id, current_user["id"])
+    try:
+        session = await asyncio.to_thread(storage.complete, upload_id)
+    except UploadNotFound:
+        # Already completed, aborted or expired between the lookup and completion
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.received)})
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _register_document(session)
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    await asyncio.to_thread(_upload_session, upload_id, current_user["id"])
+    await asyncio.to_thread(storage.abort, upload_id)
+    return {"message": "Upload aborted"}
+
+@router.post("/upload-doc", dependencies=[Depends(upload_admission)])
+async def upload_document(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Single-request upload for small files; same storage and background extraction as /uploads"""
+    if not is_supported(file.filename, file.content_type):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.filename}. Only PDF, TXT, and MD are supported.")
+    # The multipart parser already spooled the file to disk; copy it over chunk by chunk
+    size = file.size if file.size is not None else await asyncio.to_thread(lambda: file.file.seek(0, os.SEEK_END))
+    await file.seek(0)
+    try:
+        session = await asyncio.to_thread(storage.begin, current_user["id"], file.filename, file.content_type, size)
+    except UploadError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        await asyncio.to_thread(copy_stream, storage, session["upload_id"], file.file)
+        session = await asyncio.to_thread(storage.complete, session["upload_id"])
+    except Exception:
+        await asyncio.to_thread(storage.abort, session["upload_id"])
+        raise
+    return await _register_document(session)
 
 @router.get("/documents")
 async def list_documents(current_user: dict = Depends(get_current_user)):
     """List user uploaded documents"""
     try:
         print(f"Fetching documents for user: {current_user['id']}")
-        response = supabase.table("documents") \
-            .select("*") \
+        response = await supabase.table("documents") \
+            .select(DOCUMENT_COLUMNS) \
             .eq("user_id", current_user["id"]) \
             .order("created_at", desc=True) \
-            .execute()
+            .aexecute()
         print(f"Found {len(response.data)} documents")
         return response.data
     except Exception as e:
         print(f"Error listing documents: {e}")
         return []
-    
-    # 3. Return to frontend OR pass to your LLM agent
+
+@router.get("/documents/{document_id}")
+async def get_document(document_id: str, current_user: dict = Depends(get_current_user)):
+    """Document metadata, including extraction status (processing, ready or failed)"""
+    response = await supabase.table("documents") \
+        .select(DOCUMENT_COLUMNS) \
+        .eq("id", document_id) \
+        .eq("user_id", current_user["id"]) \
+        .aexecute()
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return response.data[0]
+
+# ------------------- Metrics -------------------
+@router.get("/metrics")
+async def metrics(current_user: dict = Depends(get_admin_user)):
     return {
-        "filename": file.filename,
-        "character_count": len(clean_text),
-        "content": clean_text 
-    }
\ No newline at end of file
+        "admission": {
+            "chat": chat_limiter.snapshot(),
+            "batch": batch_limiter.snapshot(),
+            "upload": upload_limiter.snapshot(),
+        },
+        "single_flight": {
+            "send_message": message_flight.snapshot(),
+            "tavily": search_flight.snapshot(),
+            "llm": llm_flight.snapshot(),
+        },
+        "llm_gateway": {
+            "large": llm_gateway.snapshot(),
+            "fast": fast_gateway.snapshot(),
+        },
+        "llm_tiers": tier_stats.snapshot(),
+        "llm_scheduler": llm_scheduler.snapshot(),
+        "speculative_research": speculator.snapshot(),
+        "token_usage": usage_totals.snapshot(),
+        "strategy_render_cache": render_cache.snapshot(),
+        "http_pool": http_pool.snapshot(),
+        "circuit_breakers": breakers_snapshot(),
+        "deadlines": deadline_stats.snapshot(),
+        "search": search_index.stats.snapshot(),
+        "websocket": ws_hub.snapshot(),
+        "compression": compression_stats.snapshot(),
+        "profiling": profiler.snapshot(),
+        "storage": storage.stats.snapshot(),
+        "document_jobs": {
+            "extraction": extraction_jobs.snapshot(),
+            "summary": summary_jobs.snapshot(),
+        },
+        "document_summaries": {**summary_stats.snapshot(), "single_flight": summary_flight.snapshot()},
+    }
+
+@router.get("/admin/usage/chats/{chat_id}")
+async def chat_usage(chat_id: str, current_user: dict = Depends(get_admin_user)):
+    """Per-turn and per-session token usage for a chat"""
+    response = await supabase.table("chat_messages") \
+        .select("id, timestamp, usage") \
+        .eq("chat_session_id", chat_id) \
+        .eq("role", "assistant") \
+        .order("timestamp") \
+        .aexecute()
+    
+    turns = [row for row in response.data if row.get("usage")]
+    session = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "over_budget_turns": 0, "nodes": {}}
+    for row in turns:
+        usage = row["usage"]
+        for key in ("input_tokens", "output_tokens", "total_tokens"):
+            session[key] += usage.get(key, 0)
+        session["over_budget_turns"] += int(bool(usage.get("over_budget")))
+        for node, entry in usage.get("nodes", {}).items():
+            totals = session["nodes"].setdefault(node, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+            for key in totals:
+                totals[key] += entry.get(key, 0)
+    
+    return {"chat_id": chat_id, "session": session, "turns": turns}
+# ------------------- Profiling -------------------
+@router.get("/admin/profiling")
+async def profiling_status(current_user: dict = Depends(get_admin_user)):
+    """Armed rules, sampling settings and the captures currently on disk"""
+    return {**profiler.snapshot(), "captures": list(reversed(profiler.captures))}
+
+@router.post("/admin/profiling")
+async def arm_profiling(request: ProfilingRuleRequest, current_user: dict = Depends(get_admin_user)):
+    """Profile the next `count` requests whose path starts with `path_prefix`"""
+    if request.mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported profiling mode: {request.mode}")
+    if request.count < 1:
+        raise HTTPException(status_code=400, detail="count must be at least 1")
+    if request.sample_rate is not None:
+        profiler.sample_rate = min(max(request.sample_rate, 0.0), 1.0)
+    rule = profiler.arm(request.path_prefix, request.mode, request.count)
+    return {"path_prefix": request.path_prefix, **rule, "sample_rate": profiler.sample_rate}
+
+@router.delete("/admin/profiling")
+async def disarm_profiling(path_prefix: Optional[str] = None, current_user: dict = Depends(get_admin_user)):
+    profiler.disarm(path_prefix)
+    return {"rules": dict(profiler.rules)}
+
+@router.get("/admin/profiling/captures/{filename}")
+async def download_profile(filename: str, current_user: dict = Depends(get_admin_user)):
+    """Download a capture file (.prof, .txt or .folded)"""
+    path = profiler.file_path(filename)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=filename)
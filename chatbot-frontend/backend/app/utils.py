@@ -1,3 +1,7 @@
+import html
+import threading
+from collections import OrderedDict
+
 from agent.schemas import MarketingStrategy
 
 def format_strategy(strategy: MarketingStrategy) -> str:
@@ -40,4 +44,121 @@ def format_strategy(strategy: MarketingStrategy) -> str:
         for ref in strategy.references:
             lines.append(f"- {ref}")
     
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
+
+
+def format_strategy_text(strategy: MarketingStrategy) -> str:
+    """Plain-text rendering (exports, emails, terminals)"""
+    lines = ["90-DAY MARKETING STRATEGY", ""]
+    for title, value in [
+        ("Product Overview", strategy.product_overview),
+        ("Core Value Proposition", strategy.value_proposition),
+        ("Target Audience", strategy.target_audience),
+    ]:
+        lines += [title.upper(), value or "Not specified", ""]
+    
+    lines.append("RECOMMENDED CHANNELS")
+    lines += [f"  * {channel}" for channel in strategy.channels]
+    
+    months = [strategy.month_1, strategy.month_2, strategy.month_3]
+    for i, month in enumerate(months, 1):
+        lines += ["", f"MONTH {i}: {month.focus}", "  Key Activities:"]
+        lines += [f"    * {activity}" for activity in month.key_activities]
+        lines.append("  KPIs:")
+        lines += [f"    * {kpi}" for kpi in month.kpis]
+        if month.references:
+            lines.append("  References:")
+            lines += [f"    * {ref}" for ref in month.references]
+    
+    for title, items in [
+        ("Risks & Mitigation", strategy.risks_and_mitigation),
+        ("Expected Outcomes", strategy.expected_outcomes),
+        ("Overall References", strategy.references),
+    ]:
+        if items:
+            lines += ["", title.upper()]
+            lines += [f"  * {item}" for item in items]
+    
+    return "\n".join(lines)
+
+
+def format_strategy_html(strategy: MarketingStrategy) -> str:
+    """HTML fragment rendering; every model-generated value is escaped"""
+    e = html.escape
+    
+    def bullets(items):
+        return "<ul>" + "".join(f"<li>{e(item)}</li>" for item in items) + "</ul>"
+    
+    parts = ["<h1>90-Day Marketing Strategy</h1>"]
+    parts.append(f"<h2>Product Overview</h2><p>{e(strategy.product_overview or 'Not specified')}</p>")
+    parts.append(f"<h2>Core Value Proposition</h2><p>{e(strategy.value_proposition or 'Not specified')}</p>")
+    parts.append(f"<h2>Target Audience</h2><p>{e(strategy.target_audience or 'Not specified')}</p>")
+    parts.append("<h2>Recommended Channels</h2>" + bullets(strategy.channels))
+    
+    parts.append("<h2>90-Day Execution Roadmap</h2>")
+    months = [strategy.month_1, strategy.month_2, strategy.month_3]
+    for i, month in enumerate(months, 1):
+        parts.append(f"<h3>Month {i}: {e(month.focus)}</h3>")
+        parts.append("<h4>Key Activities</h4>" + bullets(month.key_activities))
+        parts.append("<h4>KPIs</h4>" + bullets(month.kpis))
+        if month.references:
+            parts.append("<h4>References</h4>" + bullets(month.references))
+    
+    parts.append("<h2>Risks &amp; Mitigation</h2>" + bullets(strategy.risks_and_mitigation))
+    parts.append("<h2>Expected Outcomes</h2>" + bullets(strategy.expected_outcomes))
+    if strategy.references:
+        parts.append("<h2>Overall References &amp; Further Reading</h2>" + bullets(strategy.references))
+    
+    return "\n".join(parts)
+
+
+def summarize_strategy(strategy: dict) -> str:
+    """Compact stand-in for a generated strategy in follow-up prompts (instead of the full markdown)"""
+    months = "; ".join(
+        f"Month {i}: {strategy[f'month_{i}']['focus']}" for i in (1, 2, 3) if strategy.get(f"month_{i}")
+    )
+    return (
+        "[Generated a 90-day marketing strategy] "
+        f"Value proposition: {strategy.get('value_proposition', '')} | "
+        f"Channels: {', '.join(strategy.get('channels', []))} | {months}"
+    )
+
+
+STRATEGY_RENDERERS = {
+    "markdown": format_strategy,
+    "html": format_strategy_html,
+    "text": format_strategy_text,
+}
+
+
+class RenderCache:
+    """LRU of rendered strategies keyed by (message_id, format); stored strategies never change"""
+    
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def render(self, message_id: str, fmt: str, strategy_json: dict) -> str:
+        key = (message_id, fmt)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        
+        self.misses += 1
+        rendered = STRATEGY_RENDERERS[fmt](MarketingStrategy.model_validate(strategy_json))
+        with self._lock:
+            self._entries[key] = rendered
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+    
+    def snapshot(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+render_cache = RenderCache()
\ No newline at end of file
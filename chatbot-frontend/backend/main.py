@@ -1,11 +1,18 @@
 # main.py
 
+import argparse
 import asyncio
+import json
 import os
+import statistics
+import sys
+import time
 from dotenv import load_dotenv
 
 from agent.graph import marketing_agent
 from agent.schemas import MarketingStrategy, ProductAnalysis
+from agent.usage import track_usage
+from app.utils import format_strategy, summarize_strategy
 
 load_dotenv()
 
@@ -117,5 +124,176 @@ async def chatbot():
         else:
             print("Bot: Unable to generate a complete strategy. Please provide a clearer product description.")
 
+# ------------------- Batch / replay mode -------------------
+
+def load_records(path: str) -> list:
+    """Read prompts or transcripts, one per line.
+
+    Each line is either plain text (a single prompt) or JSON with one of:
+    "prompt": str, "transcript": [str | {"role", "content"}], or "turns" as
+    written by this tool (so previous results can be replayed).
+    """
+    records = []
+    skipped = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                data = line
+            if not isinstance(data, (str, dict)):
+                data = line
+            if isinstance(data, str):
+                records.append({"id": line_no, "messages": [data], "baseline": None})
+                continue
+            if "turns" in data:
+                messages = [turn["user"] for turn in data["turns"]]
+            elif "transcript" in data:
+                messages = [
+                    m if isinstance(m, str) else m["content"]
+                    for m in data["transcript"]
+                    if isinstance(m, str) or m.get("role") == "user"
+                ]
+            elif "prompt" in data:
+                messages = [data["prompt"]]
+            else:
+                # e.g. the {"id", "error"} lines written for failed records: nothing to run
+                skipped.append(data.get("id", line_no))
+                continue
+            records.append({"id": data.get("id", line_no), "messages": messages, "baseline": data.get("turns")})
+    if skipped:
+        print(f"Skipped {len(skipped)} record(s) without turns, transcript or prompt: {skipped}", file=sys.stderr)
+    return records
+
+
+async def run_record(record: dict) -> dict:
+    """Run every user message of a record through the agent, timing each graph stage"""
+    history = []
+    turns = []
+    record_start = time.monotonic()
+    for user_message in record["messages"]:
+        state = {}
+        timings = {}
+        turn_start = last = time.monotonic()
+        with track_usage(label=f"cli record {record['id']}") as usage:
+            async for update in marketing_agent.astream(
+                {"messages": history, "user_message": user_message}, stream_mode="updates"
+            ):
+                for node, values in update.items():
+                    now = time.monotonic()
+                    timings[node] = round(now - last, 3)
+                    last = now
+                    state.update(values or {})
+
+        strategy = state["strategy"].model_dump(mode="json") if state.get("strategy") else None
+        response = format_strategy(state["strategy"]) if strategy else state.get("conversation_response")
+        turns.append({
+            "user": user_message,
+            "intent": state.get("intent"),
+            "response": response,
+            "analysis": state["analysis"].model_dump(mode="json") if state.get("analysis") else None,
+            "strategy": strategy,
+            "timings": timings,
+            "seconds": round(time.monotonic() - turn_start, 3),
+            "usage": usage.to_dict(),
+        })
+        history += [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": summarize_strategy(strategy) if strategy else (response or "")},
+        ]
+
+    return {"id": record["id"], "turns": turns, "seconds": round(time.monotonic() - record_start, 3)}
+
+
+def compare_to_baseline(result: dict, baseline_turns: list) -> dict:
+    """Per-stage timing deltas against a previous run of the same record"""
+    stages = {}
+    for turn, base in zip(result["turns"], baseline_turns or []):
+        for stage, seconds in turn["timings"].items():
+            if stage in base.get("timings", {}):
+                entry = stages.setdefault(stage, {"current": 0.0, "baseline": 0.0})
+                entry["current"] += seconds
+                entry["baseline"] += base["timings"][stage]
+    return {stage: {k: round(v, 3) for k, v in entry.items()} for stage, entry in stages.items()}
+
+
+async def run_batch(path: str, output: str, concurrency: int, replay: bool, threshold: float) -> int:
+    records = load_records(path)
+    if replay and not any(r["baseline"] for r in records):
+        print("Replay file has no recorded timings (expected output of a previous run)", file=sys.stderr)
+        return 2
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def guarded(record):
+        async with slots:
+            try:
+                result = await run_record(record)
+            except Exception as e:
+                return {"id": record["id"], "error": repr(e)}
+            if replay:
+                result["baseline_comparison"] = compare_to_baseline(result, record["baseline"])
+            return result
+
+    out = open(output, "w", encoding="utf-8") if output else sys.stdout
+    start = time.monotonic()
+    stage_totals = {}
+    failures = 0
+    try:
+        for next_done in asyncio.as_completed([guarded(r) for r in records]):
+            result = await next_done
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if "error" in result:
+                failures += 1
+                continue
+            for stage, entry in result.get("baseline_comparison", {}).items():
+                totals = stage_totals.setdefault(stage, {"current": [], "baseline": []})
+                totals["current"].append(entry["current"])
+                totals["baseline"].append(entry["baseline"])
+    finally:
+        if output:
+            out.close()
+
+    elapsed = time.monotonic() - start
+    print(f"{len(records)} records in {elapsed:.1f}s ({failures} failed, concurrency {concurrency})", file=sys.stderr)
+
+    regressions = 0
+    for stage, totals in sorted(stage_totals.items()):
+        current = statistics.median(totals["current"])
+        baseline = statistics.median(totals["baseline"])
+        change = (current - baseline) / baseline if baseline else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  <-- REGRESSION"
+        print(f"  {stage:<14} median {current:7.3f}s vs {baseline:7.3f}s ({change:+.0%}){flag}", file=sys.stderr)
+
+    return 1 if regressions or failures else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Marketing Strategy Agent CLI")
+    parser.add_argument("--input", help="File of prompts/transcripts to run non-interactively (one per line)")
+    parser.add_argument("--replay", help="Re-run a recorded results file and compare per-stage timings")
+    parser.add_argument("--output", help="Write JSONL results here (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Records processed in parallel")
+    parser.add_argument("--regression-threshold", type=float, default=0.2,
+                        help="Fractional slowdown of a stage median that counts as a regression in --replay")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.input or args.replay:
+        sys.exit(asyncio.run(run_batch(
+            args.replay or args.input,
+            args.output,
+            max(1, args.concurrency),
+            replay=bool(args.replay),
+            threshold=args.regression_threshold,
+        )))
     asyncio.run(chatbot())
\ No newline at end of file
@@ -0,0 +1,12 @@
+-- Refresh tokens are stored by sha256(jti) instead of the full JWT string.
+-- The legacy `token` column stays (nullable) so tokens issued before this
+-- change keep working until they expire and are swept.
+alter table refresh_tokens add column if not exists token_hash text;
+alter table refresh_tokens alter column token drop not null;
+
+create unique index if not exists refresh_tokens_token_hash_idx
+    on refresh_tokens (token_hash);
+
+-- Supports the background sweeper's `expires_at < now()` delete
+create index if not exists refresh_tokens_expires_at_idx
+    on refresh_tokens (expires_at);
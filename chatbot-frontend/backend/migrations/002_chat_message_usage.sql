@@ -0,0 +1,4 @@
+-- Per-turn LLM token usage, written on assistant messages:
+-- {"nodes": {"<node>": {"calls", "input_tokens", "output_tokens"}},
+--  "input_tokens", "output_tokens", "total_tokens", "over_budget"}
+alter table chat_messages add column if not exists usage jsonb;
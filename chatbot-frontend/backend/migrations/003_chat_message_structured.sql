@@ -0,0 +1,4 @@
+-- Structured agent output kept alongside the rendered markdown in `content`,
+-- so follow-up turns and exports can read fields instead of re-parsing text.
+alter table chat_messages add column if not exists strategy jsonb;
+alter table chat_messages add column if not exists analysis jsonb;
@@ -0,0 +1,72 @@
+-- Full-text search over chat messages and uploaded documents (GET /search).
+-- The tsvector columns are generated, so every insert/update keeps the
+-- index current without any application-side indexing.
+alter table chat_messages add column if not exists search_vector tsvector
+    generated always as (to_tsvector('english', coalesce(content, ''))) stored;
+
+create index if not exists chat_messages_search_idx
+    on chat_messages using gin (search_vector);
+
+-- Extracted document text (previously only a 200 character summary was kept)
+alter table documents add column if not exists content text;
+
+alter table documents add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple', coalesce(filename, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) stored;
+
+create index if not exists documents_search_idx
+    on documents using gin (search_vector);
+
+create or replace function search_user_content(
+    p_user_id text,
+    p_query text,
+    p_kind text default 'all',
+    p_limit int default 20,
+    p_offset int default 0,
+    p_start_sel text default '<mark>',
+    p_stop_sel text default '</mark>'
+)
+returns table (
+    kind text,
+    id text,
+    chat_id text,
+    title text,
+    role text,
+    snippet text,
+    score real,
+    created_at timestamptz
+)
+language sql stable
+as $$
+    with q as (
+        select websearch_to_tsquery('english', p_query) as query,
+               format('StartSel=%s, StopSel=%s, MaxFragments=2, MaxWords=24, MinWords=8',
+                      p_start_sel, p_stop_sel) as options
+    ),
+    hits as (
+        select 'message'::text as kind, m.id::text as id, m.chat_session_id::text as chat_id,
+               s.title, m.role, m.content as body, ts_rank_cd(m.search_vector, q.query) as score,
+               m.timestamp as created_at
+        from chat_messages m
+        join chat_sessions s on s.id = m.chat_session_id, q
+        where p_kind in ('all', 'message')
+          and s.user_id::text = p_user_id
+          and m.search_vector @@ q.query
+        union all
+        select 'document', d.id::text, null, d.filename, null, coalesce(d.content, d.content_summary),
+               ts_rank_cd(d.search_vector, q.query), d.created_at
+        from documents d, q
+        where p_kind in ('all', 'document')
+          and d.user_id::text = p_user_id
+          and d.search_vector @@ q.query
+        order by score desc, created_at desc
+        limit p_limit offset p_offset
+    )
+    -- ts_headline is expensive, so it only runs on the page being returned
+    select h.kind, h.id, h.chat_id, h.title, h.role,
+           ts_headline('english', h.body, q.query, q.options), h.score, h.created_at
+    from hits h, q
+    order by h.score desc, h.created_at desc;
+$$;
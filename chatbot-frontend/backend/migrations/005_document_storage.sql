@@ -0,0 +1,9 @@
+-- Documents are now stored (file_path is the storage key) and their text is
+-- extracted in the background after the upload completes. Existing rows were
+-- extracted synchronously, hence the 'ready' default.
+alter table documents add column if not exists status text not null default 'ready';
+alter table documents add column if not exists error text;
+alter table documents add column if not exists character_count integer;
+
+update documents set character_count = length(content)
+    where character_count is null and content is not null;
@@ -0,0 +1,14 @@
+-- Map-reduce document summaries (written in the background after extraction).
+-- Summaries are cached by the SHA-256 of the extracted text, so re-uploading
+-- the same document (by anyone) reuses the existing summary.
+create table if not exists document_summaries (
+    content_hash text primary key,
+    summary text not null,
+    created_at timestamptz not null default now()
+);
+
+alter table documents add column if not exists content_hash text;
+-- none: only the extraction preview exists | pending | ready | failed
+alter table documents add column if not exists summary_status text not null default 'none';
+
+create index if not exists documents_content_hash_idx on documents (content_hash);
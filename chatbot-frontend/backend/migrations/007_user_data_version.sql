@@ -0,0 +1,35 @@
+-- Version of everything a user sees in the sidebar and in their chats.
+-- chat_cache keys cached chat lists, message histories and ETags on it, so it
+-- has to move on every write no matter which worker (or tool) made it: the
+-- triggers below bump it instead of the application.
+alter table users add column if not exists data_version bigint not null default 0;
+
+create or replace function bump_data_version_for_session() returns trigger
+language plpgsql as $$
+begin
+    update users set data_version = data_version + 1
+        where id = coalesce(new.user_id, old.user_id);
+    return null;
+end;
+$$;
+
+create or replace function bump_data_version_for_message() returns trigger
+language plpgsql as $$
+begin
+    update users set data_version = data_version + 1
+        where id = (select user_id from chat_sessions where id = new.chat_session_id);
+    return null;
+end;
+$$;
+
+drop trigger if exists chat_sessions_data_version on chat_sessions;
+create trigger chat_sessions_data_version
+    after insert or update or delete on chat_sessions
+    for each row execute function bump_data_version_for_session();
+
+-- Messages are only ever inserted; deleting a chat removes them with it and
+-- the chat_sessions trigger already covers that
+drop trigger if exists chat_messages_data_version on chat_messages;
+create trigger chat_messages_data_version
+    after insert on chat_messages
+    for each row execute function bump_data_version_for_message();
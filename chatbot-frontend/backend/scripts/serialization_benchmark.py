@@ -0,0 +1,100 @@
+"""
+Serialization CPU and bytes-on-the-wire benchmark for large chat histories.
+
+Compares the previous response path (response_model validation + FastAPI's
+jsonable_encoder + stdlib json) with the trusted-row orjson path, then the
+size and cost of gzip / brotli on the serialized body.
+
+    python scripts/serialization_benchmark.py --messages 200 --strategy-kb 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.components.compression import BROTLI_AVAILABLE, compress
+from app.components.fast_json import ORJSON_AVAILABLE, dumps
+from app.routes import MessageResponse
+
+VOCABULARY = (
+    "launch audience channel pricing retention onboarding referral webinar partner newsletter LinkedIn "
+    "TikTok SEO backlinks CAC LTV churn cohort trial upsell positioning competitor founder community "
+    "case study landing page checklist budget KPI conversion signup demo outreach podcast influencer "
+    "weekly monthly experiment hypothesis segment persona SMB enterprise pipeline content calendar"
+).split()
+
+
+def _strategy_markdown(rng: random.Random, size_bytes: int) -> str:
+    """Varied, markdown-shaped text so compression ratios resemble real strategies"""
+    lines = ["## 90-Day Marketing Strategy", ""]
+    while sum(len(line) + 1 for line in lines) < size_bytes:
+        words = rng.choices(VOCABULARY, k=rng.randint(8, 20))
+        prefix = rng.choice(["- ", "- ", "### ", ""])
+        lines.append(prefix + " ".join(words).capitalize() + f" ({rng.randint(1, 90)} days, {rng.randint(2, 40)}%)")
+    return "\n".join(lines)
+
+
+def make_history(messages: int, strategy_kb: int) -> List[dict]:
+    rng = random.Random(7)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"6f1c2b9e-0000-4000-8000-{i:012d}",
+            "role": "assistant" if i % 2 else "user",
+            "content": (
+                _strategy_markdown(rng, strategy_kb * 1024) if i % 6 == 5
+                else " ".join(rng.choices(VOCABULARY, k=rng.randint(10, 40)))
+            ),
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(messages)
+    ]
+
+
+def bench(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        result = fn()
+    return (time.process_time() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history serialization benchmark")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--strategy-kb", type=int, default=8, help="Size of each strategy markdown message")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = make_history(args.messages, args.strategy_kb)
+    adapter = TypeAdapter(List[MessageResponse])
+
+    def previous_path():
+        validated = adapter.validate_python(rows)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    old_ms, old_body = bench(previous_path, args.repeat)
+    new_ms, new_body = bench(lambda: dumps(rows), args.repeat)
+    print(f"history: {args.messages} messages, {len(new_body) / 1024:.1f} KiB JSON (orjson={ORJSON_AVAILABLE})")
+    print(f"  validate + jsonable_encoder + json: {old_ms:8.2f} ms/response")
+    print(f"  trusted rows + fast_json.dumps:     {new_ms:8.2f} ms/response  ({old_ms / new_ms:.1f}x)")
+
+    encodings = ["gzip"] + (["br"] if BROTLI_AVAILABLE else [])
+    for encoding in encodings:
+        ms, compressed = bench(lambda: compress(new_body, encoding), max(1, args.repeat // 5))
+        print(f"  {encoding:4}: {len(compressed) / 1024:8.1f} KiB on the wire "
+              f"({len(compressed) / len(new_body):.1%} of raw), {ms:.2f} ms/response")
+    if not BROTLI_AVAILABLE:
+        print("  br:   skipped (install `brotli` to enable)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Load test for the /ws chat transport: how many concurrent authenticated
+connections one worker sustains, and what heartbeat round trips look like
+while they are all open.
+
+    python scripts/ws_load_test.py --url ws://localhost:8000/ws --token <access token> \
+        --connections 500 1000 2000 --hold 30
+
+Each step opens N connections (ramped in batches), authenticates them, then
+pings every connection once per second for --hold seconds. It reports connect
+failures, p50/p95/p99 ping RTT and dropped connections per step.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import websockets
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _open(url: str, token: str, stats: dict):
+    start = time.monotonic()
+    try:
+        socket = await websockets.connect(url, open_timeout=30, ping_interval=None, max_queue=256)
+        await socket.send(json.dumps({"type": "auth", "token": token}))
+        while True:
+            frame = json.loads(await asyncio.wait_for(socket.recv(), 30))
+            if frame.get("type") == "ready":
+                break
+        stats["connect_seconds"].append(time.monotonic() - start)
+        return socket
+    except Exception as e:
+        stats["connect_errors"].append(repr(e))
+        return None
+
+
+async def _hold(socket, seconds: float, stats: dict):
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            sent = time.monotonic()
+            await socket.send(json.dumps({"type": "ping", "ts": sent}))
+            while True:
+                frame = json.loads(await asyncio.wait_for(socket.recv(), 30))
+                if frame.get("type") == "pong":
+                    break
+                if frame.get("type") == "ping":
+                    await socket.send(json.dumps({"type": "pong"}))
+            stats["rtt_seconds"].append(time.monotonic() - sent)
+            await asyncio.sleep(max(0.0, 1.0 - (time.monotonic() - sent)))
+    except Exception as e:
+        stats["dropped"].append(repr(e))
+    finally:
+        await socket.close()
+
+
+async def run_step(url: str, token: str, connections: int, hold: float, batch: int) -> dict:
+    stats = {"connect_seconds": [], "connect_errors": [], "rtt_seconds": [], "dropped": []}
+    sockets = []
+    for offset in range(0, connections, batch):
+        opened = await asyncio.gather(*[_open(url, token, stats) for _ in range(min(batch, connections - offset))])
+        sockets.extend(s for s in opened if s is not None)
+    await asyncio.gather(*[_hold(s, hold, stats) for s in sockets])
+    rtt_ms = [r * 1000 for r in stats["rtt_seconds"]]
+    return {
+        "connections": connections,
+        "established": len(sockets),
+        "connect_errors": len(stats["connect_errors"]),
+        "dropped": len(stats["dropped"]),
+        "connect_p95_ms": round(_percentile(stats["connect_seconds"], 0.95) * 1000, 1),
+        "rtt_p50_ms": round(statistics.median(rtt_ms), 2) if rtt_ms else 0.0,
+        "rtt_p95_ms": round(_percentile(rtt_ms, 0.95), 2),
+        "rtt_p99_ms": round(_percentile(rtt_ms, 0.99), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent connection load test for /ws")
+    parser.add_argument("--url", default="ws://localhost:8000/ws")
+    parser.add_argument("--token", required=True, help="Access token used by every connection")
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--hold", type=float, default=15, help="Seconds to keep each step's connections busy")
+    parser.add_argument("--batch", type=int, default=100, help="Connections opened concurrently while ramping")
+    args = parser.parse_args()
+
+    for connections in args.connections:
+        print(json.dumps(await run_step(args.url, args.token, connections, args.hold, args.batch)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
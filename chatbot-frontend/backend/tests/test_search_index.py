@@ -0,0 +1,125 @@
+"""
+SQLite FTS5 search backend: indexing, ranking, user scoping and deletion.
+
+Rows must match the `search_user_content` RPC (migrations/004) so routes can
+swap backends with SEARCH_BACKEND.
+"""
+import re
+from pathlib import Path
+
+import pytest
+
+from app.components.search_index import SQLiteSearchIndex
+
+MIGRATION = Path(__file__).resolve().parent.parent / "migrations" / "004_search_index.sql"
+
+
+def _rpc_columns() -> list:
+    """Column names of the RPC's `returns table (...)`, in order"""
+    body = re.search(r"returns table \((.*?)\)\s*language", MIGRATION.read_text(), re.S).group(1)
+    return [line.split()[0] for line in body.strip().splitlines()]
+
+
+def assert_rpc_shape(row: dict) -> None:
+    assert list(row) == _rpc_columns()
+    assert row["kind"] in ("message", "document")
+    assert isinstance(row["id"], str)
+    assert isinstance(row["score"], float)
+    assert isinstance(row["created_at"], str)
+    if row["kind"] == "message":
+        assert isinstance(row["chat_id"], str) and row["role"] in ("user", "assistant")
+    else:
+        assert row["chat_id"] is None and row["role"] is None
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SQLiteSearchIndex(str(tmp_path / "search.db"))
+
+
+def test_message_and_document_rows_match_rpc_shape(index):
+    index.add_message("u1", "c1", "m1", "user", "We sell a dental scheduling app", title="Dentists")
+    index.add_document("u1", "d1", "pricing.md", "Dental clinics pay per seat")
+
+    rows = index.search("u1", "dental")
+
+    assert {(row["kind"], row["id"]) for row in rows} == {("message", "m1"), ("document", "d1")}
+    for row in rows:
+        assert_rpc_shape(row)
+    message = next(row for row in rows if row["kind"] == "message")
+    assert (message["chat_id"], message["title"], message["role"]) == ("c1", "Dentists", "user")
+    assert index.stats.indexed == 2
+
+
+def test_ranks_stronger_matches_first(index):
+    # bm25 needs the term to be rare in the corpus to give it any weight
+    for i in range(5):
+        index.add_message("u1", "c1", f"m{i}", "user", f"unrelated pricing question {i}")
+    index.add_document("u1", "weak", "notes.md", "Launch plan with one mention of newsletters and many other channels")
+    index.add_document("u1", "strong", "newsletter.md", "Newsletter growth: newsletter referrals and newsletter sponsorships")
+
+    rows = index.search("u1", "newsletter")
+
+    assert [row["id"] for row in rows] == ["strong", "weak"]
+    assert rows[0]["score"] > rows[1]["score"]
+
+
+def test_snippet_is_escaped_and_highlighted(index):
+    index.add_message("u1", "c1", "m1", "assistant", "Use <b>cold</b> outreach & referrals")
+
+    snippet = index.search("u1", "outreach")[0]["snippet"]
+
+    assert "<mark>outreach</mark>" in snippet
+    assert "&lt;b&gt;cold&lt;/b&gt;" in snippet and "&amp;" in snippet
+
+
+def test_prefix_match_kind_filter_and_paging(index):
+    for i in range(3):
+        index.add_message("u1", "c1", f"m{i}", "user", f"marketing budget option {i}")
+    index.add_document("u1", "d1", "budget.pdf", "marketing budget spreadsheet")
+
+    assert len(index.search("u1", "market")) == 4
+    assert {row["kind"] for row in index.search("u1", "budget", kind="document")} == {"document"}
+    assert {row["kind"] for row in index.search("u1", "budget", kind="message")} == {"message"}
+    first, second = index.search("u1", "budget", limit=2), index.search("u1", "budget", limit=2, offset=2)
+    assert len(first) == len(second) == 2
+    assert not {row["id"] for row in first} & {row["id"] for row in second}
+
+
+def test_fts_syntax_in_queries_is_treated_as_text(index):
+    index.add_message("u1", "c1", "m1", "user", "pricing OR packaging")
+
+    assert [row["id"] for row in index.search("u1", 'pricing" OR NEAR(x')] == []
+    assert [row["id"] for row in index.search("u1", '"pricing" OR')] == ["m1"]
+    assert index.search("u1", "  ***  ") == []
+
+
+def test_users_only_see_their_own_content(index):
+    index.add_message("u1", "c1", "m1", "user", "confidential roadmap for the launch")
+    index.add_document("u1", "d1", "roadmap.pdf", "confidential roadmap")
+    index.add_message("u2", "c2", "m2", "user", "public launch notes")
+
+    assert {row["id"] for row in index.search("u1", "launch")} == {"m1"}
+    assert [row["id"] for row in index.search("u2", "launch")] == ["m2"]
+    assert index.search("u2", "confidential roadmap") == []
+    assert index.search("u3", "launch") == []
+
+
+def test_remove_chat_deletes_only_that_chat(index):
+    index.add_message("u1", "c1", "m1", "user", "referral program ideas")
+    index.add_message("u1", "c1", "m2", "assistant", "referral rewards")
+    index.add_message("u1", "c2", "m3", "user", "referral partners")
+    index.add_document("u1", "d1", "referrals.md", "referral playbook")
+    index.add_message("u2", "c1", "m4", "user", "referral program")  # same chat id, other user
+
+    index.remove_chat("u1", "c1")
+
+    assert {row["id"] for row in index.search("u1", "referral")} == {"m3", "d1"}
+    assert [row["id"] for row in index.search("u2", "referral")] == ["m4"]
+
+
+def test_index_persists_across_instances(tmp_path):
+    path = str(tmp_path / "search.db")
+    SQLiteSearchIndex(path).add_message("u1", "c1", "m1", "user", "persistent content")
+
+    assert [row["id"] for row in SQLiteSearchIndex(path).search("u1", "persistent")] == ["m1"]
@@ -5,7 +5,7 @@ import remarkGfm from 'remark-gfm';
 import { chatAPI } from '../services/api';
 import './ChatInterface.css';
 
-export default function ChatInterface({ chat }) {
+export default function ChatInterface({ chat, onDocumentUploaded }) {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
@@ -80,18 +80,26 @@ export default function ChatInterface({ chat }) {
     setUploadingFile(true);
     try {
       const result = await chatAPI.uploadDocument(file);
+      onDocumentUploaded?.();
 
       // Add file upload notification as a message
+      const status = {
+        ready: `${result.character_count} characters`,
+        failed: result.error || 'text extraction failed',
+        processing: 'still processing',
+      }[result.status];
       const fileMsg = {
         id: `file-${Date.now()}`,
         role: 'system',
-        content: `📎 Uploaded: ${result.filename} (${result.character_count} characters)`,
+        content: `📎 Uploaded: ${result.filename || file.name} (${status})`,
         timestamp: new Date().toISOString(),
       };
       setMessages(prev => [...prev, fileMsg]);
 
       // Optionally, you can auto-send the content or just notify
-      setInput(`Here's the document content:\n\n${(result.summary || '').substring(0, 500)}...`);
+      if (result.status === 'ready') {
+        setInput(`Here's the document content:\n\n${(result.content_summary || '').substring(0, 500)}...`);
+      }
     } catch (error) {
       console.error('Failed to upload file:', error);
     } finally {
@@ -4,12 +4,15 @@ import { chatAPI } from '../services/api';
 import toast from '../utils/toast';
 import './DocumentList.css';
 
-export default function DocumentList() {
-    const [documents, setDocuments] = useState([]);
-    const [loading, setLoading] = useState(true);
+export default function DocumentList({ initialDocuments = null }) {
+    const [documents, setDocuments] = useState(initialDocuments || []);
+    const [loading, setLoading] = useState(!initialDocuments);
 
     useEffect(() => {
-        loadDocuments();
+        // Chat.jsx passes the list it already got from /bootstrap
+        if (!initialDocuments) {
+            loadDocuments();
+        }
     }, []);
 
     const loadDocuments = async () => {
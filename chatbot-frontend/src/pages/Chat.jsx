@@ -8,9 +8,10 @@ import { chatAPI } from '../services/api';
 import './Chat.css';
 
 export default function Chat() {
-  const { isAuthenticated } = useAuth();
+  const { isAuthenticated, updateUser } = useAuth();
   const navigate = useNavigate();
   const [chats, setChats] = useState([]);
+  const [documents, setDocuments] = useState(null);
   const [activeChat, setActiveChat] = useState(null);
   const [showDocuments, setShowDocuments] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -20,15 +21,21 @@ export default function Chat() {
       navigate('/login');
       return;
     }
-    loadChats();
+    loadInitialData();
   }, [isAuthenticated, navigate]);
 
-  const loadChats = async () => {
+  const loadInitialData = async () => {
     try {
-      const data = await chatAPI.listChats();
-      setChats(data);
-      if (data.length > 0 && !activeChat && !showDocuments) {
-        setActiveChat(data[0]);
+      const data = await chatAPI.bootstrap();
+      updateUser(data.user);
+      setChats(data.chats);
+      setDocuments(data.has_more_documents ? null : data.documents);
+      if (data.chats.length > 0 && !activeChat && !showDocuments) {
+        setActiveChat(data.chats[0]);
+      }
+      if (data.has_more_chats) {
+        // Rare: render the first page now, fill in the rest of the sidebar afterwards
+        chatAPI.listChats().then(setChats).catch(error => console.error('Failed to load chats:', error));
       }
     } catch (error) {
       console.error('Failed to load chats:', error);
@@ -111,10 +118,10 @@ export default function Chat() {
       />
       {showDocuments ? (
         <div className="chat-interface empty">
-          <DocumentList />
+          <DocumentList initialDocuments={documents} />
         </div>
       ) : (
-        <ChatInterface chat={activeChat} />
+        <ChatInterface chat={activeChat} onDocumentUploaded={() => setDocuments(null)} />
       )}
     </div>
   );
@@ -184,8 +184,21 @@ export const authAPI = {
   },
 };
 
+const UPLOAD_MAX_RETRIES = 3;
+const UPLOAD_RETRY_DELAY_MS = 1000;
+const DOCUMENT_POLL_ATTEMPTS = 60;
+const DOCUMENT_POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
 // Chat API
 export const chatAPI = {
+  // Profile, first page of chats and first page of documents in one request
+  bootstrap: async () => {
+    const response = await api.get('/bootstrap');
+    return response.data;
+  },
+
   listChats: async () => {
     const response = await api.get('/chats');
     return response.data;
@@ -216,17 +229,55 @@ export const chatAPI = {
     return response.data;
   },
 
-  uploadDocument: async (file) => {
-    const formData = new FormData();
-    formData.append('file', file);
-    const response = await api.post('/upload-doc', formData, {
-      headers: {
-        'Content-Type': 'multipart/form-data',
-      },
+  // Chunked, resumable upload: a failed chunk resumes from the offset the server has,
+  // then text extraction runs in the background and is polled until it finishes
+  uploadDocument: async (file, onProgress) => {
+    const { data: session } = await api.post('/uploads', {
+      filename: file.name,
+      size: file.size,
+      content_type: file.type || null,
     });
+    let offset = session.received;
+    let retries = 0;
+    while (offset < file.size) {
+      try {
+        const { data } = await api.put(`/uploads/${session.upload_id}`, file.slice(offset, offset + session.chunk_size), {
+          params: { offset },
+          headers: { 'Content-Type': 'application/octet-stream' },
+        });
+        offset = data.received;
+        retries = 0;
+        onProgress?.(offset / file.size);
+      } catch (error) {
+        if (retries >= UPLOAD_MAX_RETRIES || (error.response && error.response.status !== 409 && error.response.status < 500)) {
+          throw error;
+        }
+        retries += 1;
+        await sleep(UPLOAD_RETRY_DELAY_MS * retries);
+        const { data } = await api.get(`/uploads/${session.upload_id}`);
+        offset = data.received;
+      }
+    }
+    const { data: document } = await api.post(`/uploads/${session.upload_id}/complete`);
+    return chatAPI.waitForDocument(document.document_id);
+  },
+
+  getDocument: async (documentId) => {
+    const response = await api.get(`/documents/${documentId}`);
     return response.data;
   },
 
+  waitForDocument: async (documentId) => {
+    for (let attempt = 0; attempt < DOCUMENT_POLL_ATTEMPTS; attempt++) {
+      const document = await chatAPI.getDocument(documentId);
+      if (document.status !== 'processing') {
+        return document;
+      }
+      await sleep(DOCUMENT_POLL_INTERVAL_MS);
+    }
+    return { id: documentId, status: 'processing' };
+  },
+
   listDocuments: async () => {
     const response = await api.get('/documents');
     return response.data;